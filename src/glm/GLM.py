@@ -10,10 +10,24 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib import ticker
-import random
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 import matplotlib as mpl
 
+from beast_log import LogTail
+from diagnostics import export_diagnostics
+from downsample import METHODS
+from log_cache import load_log
+from hpd import summarise_glm_coefficients
+from kde import point_density
+from plot_data import assemble_points, save_figure
+from running_stats import GlmRunningSummary
+from violin_cache import draw_violins, violin_shapes
+
 # ----------------------------------------------
 # plotting parameters
 plt.rcParams.update({
@@ -45,89 +59,24 @@ plt.rcParams.update({
 # ----------------------------------------------
 
 
-def compute_hpd(samples: np.ndarray, cred_mass: float = 0.95):
-    """
-    Calculate the 1D HPD interval (Highest Posterior Density) for given samples.
-    Returns (nan, nan) if sample size is 0.
-    """
-    n = len(samples)
-    if n == 0:
-        return np.nan, np.nan
-
-    sorted_samples = np.sort(samples)
-    interval_idx_inc = int(np.floor(cred_mass * n))
-    # Fallback to regular quantiles if insufficient samples
-    if interval_idx_inc < 1:
-        return np.percentile(samples, [(1 - cred_mass) / 2 * 100,
-                                       (1 + cred_mass) / 2 * 100])
-
-    interval_width = sorted_samples[interval_idx_inc:] - sorted_samples[: n - interval_idx_inc]
-    min_idx = np.argmin(interval_width)
-    hpd_min = sorted_samples[min_idx]
-    hpd_max = sorted_samples[min_idx + interval_idx_inc]
-    return hpd_min, hpd_max
-
-
-def process_glm_data(file_path):
+def process_glm_data(file_path, burnin=0, burnin_frac=None, thin=1, cache=True):
     """
     Process GLM log file to extract coefficients and indicator variables,
     and calculate statistics like mean/median/CI/HPD.
     """
-    # Read data, skipping comment lines
-    df = pd.read_csv(file_path, sep='\t', comment='#', low_memory=False)
-
-    # Remove initial state rows (state=0)
-    df = df[df['state'] != 0]
-
-    max_coef = 0
-    for i in range(1, 16):
-        if f'country.coefficients{i}' in df.columns:
-            max_coef = i
-        else:
-            break
-
-    print(f"检测到 {max_coef} 个系数")
-
-    # Prepare results storage
-    activated_coeffs = []
-
-    for i in range(1, max_coef + 1):
-        coeff_col = f'country.coefficients{i}'
-        indicator_col = f'country.coefIndicators{i}'
-
-        # Activation mask
-        activated_mask = df[indicator_col] == 1.0
-        activated_values = df.loc[activated_mask, coeff_col].to_numpy()
-        n_activated = len(activated_values)
-
-        if n_activated > 0:
-            mean_val = activated_values.mean()
-            median_val = np.median(activated_values)
-            std_val = activated_values.std()
-            ci_lower, ci_upper = np.percentile(activated_values, [2.5, 97.5])
-            hpd_lower, hpd_upper = compute_hpd(activated_values, 0.95)
-        else:
-            mean_val = median_val = std_val = np.nan
-            ci_lower = ci_upper = hpd_lower = hpd_upper = np.nan
-
-        activated_coeffs.append({
-            'Coefficient': f'β{i}',
-            'Values': activated_values,
-            'Activation Rate': n_activated / len(df),
-            'Mean': mean_val,
-            'Median': median_val,
-            'Std': std_val,
-            '95% CI Lower': ci_lower,
-            '95% CI Upper': ci_upper,
-            'HPD Lower': hpd_lower,
-            'HPD Upper': hpd_upper,
-            'Sample Size': n_activated
-        })
+    # Stream the log; burn-in (state 0 by default) and thinning are applied while reading.
+    # With cache=True the parsed columns are memory-mapped from .beast_cache after the first run;
+    # merged chains from combine_chains.py (.npy) are loaded as they are.
+    df = load_log(file_path, cache=cache, burnin=burnin, burnin_frac=burnin_frac, thin=thin)
+
+    # All coefficients are summarised in one batched pass (one sort per column)
+    activated_coeffs = summarise_glm_coefficients(df)
+    print(f"检测到 {len(activated_coeffs)} 个系数")
 
     return activated_coeffs
 
 
-def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv"):
+def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv", verbose=True):
     """
     Export HPD intervals and other statistics to TSV and print to console.
     """
@@ -142,21 +91,35 @@ def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv"):
             '95% CI Lower': c['95% CI Lower'],
             '95% CI Upper': c['95% CI Upper'],
             'HPD Lower': c['HPD Lower'],
-            'HPD Upper': c['HPD Upper']
+            'HPD Upper': c['HPD Upper'],
+            # narrower credible masses from the same batched pass
+            'HPD 80% Lower': c.get('HPD 80% Lower', np.nan),
+            'HPD 80% Upper': c.get('HPD 80% Upper', np.nan),
+            'HPD 50% Lower': c.get('HPD 50% Lower', np.nan),
+            'HPD 50% Upper': c.get('HPD 50% Upper', np.nan)
         }
         for c in activated_coeffs
     ])
 
     # Save to file
     Path(outfile).write_text(table.to_csv(sep='\t', index=False), encoding='utf-8')
+    if not verbose:
+        return
     print("\n===== 95% HPD intervals for all coefficients =====")
     print(table.to_string(index=False, justify='right', float_format='{:,.4f}'.format))
     print(f"\nHPD table written to: {outfile}\n")
 
 
-def create_combined_plot(activated_coeffs, output_file):
+def create_combined_plot(activated_coeffs, output_files, density_norm='global',
+                         max_points=1500, dpi=600, sample_method='quantile', source=None):
     """
     Create combined violin + scatter plot using HPD intervals and density-based coloring.
+    The figure is built once and saved to every entry of `output_files`
+    (a path, or a list of paths / (path, dpi) pairs).
+    source: the log the coefficients were read from (locates the violin cache).
+    density_norm: 'global' (one density over all coefficients) or 'group' (per coefficient).
+    max_points: number of scatter points drawn per coefficient.
+    sample_method: how they are picked ('quantile', 'reservoir', 'random', 'even').
     """
     fig = plt.figure(figsize=(16, 12))
     gs = fig.add_gridspec(2, 1, height_ratios=[3, 1], hspace=0.1)
@@ -165,79 +128,36 @@ def create_combined_plot(activated_coeffs, output_file):
     ax_bar = fig.add_subplot(gs[1])
 
     # ---------- Assemble plot data with density-based coloring ----------
-    plot_data = []
-    all_values = np.array([])  # Collect all values for global density calculation
-    
-    for coeff in activated_coeffs:
-        n = len(coeff['Values'])
-        if n == 0:
-            continue
-        sample_size = min(1500, n)
-        indices = np.linspace(0, n - 1, sample_size, dtype=int)
-        sampled_values = coeff['Values'][indices]
-        all_values = np.concatenate((all_values, sampled_values))
-        
-        for v in sampled_values:
-            plot_data.append({
-                'Coefficient': coeff['Coefficient'],
-                'Value': v,
-                'Size': random.uniform(2, 5)  # Smaller point size
-            })
-
-    plot_df = pd.DataFrame(plot_data)
-    
-    # Calculate global density for consistent coloring across coefficients
-    if len(all_values) > 1:
-        from scipy.stats import gaussian_kde
-        kde = gaussian_kde(all_values)
-        plot_df['Density'] = kde(plot_df['Value'])
-        # Normalize densities to [0, 1]
-        plot_df['Density'] = (plot_df['Density'] - plot_df['Density'].min()) / \
-                             (plot_df['Density'].max() - plot_df['Density'].min())
-    else:
-        plot_df['Density'] = 0.5
-
-    np.random.seed(42)
-    jitter = 0.15
-    
+    # Contiguous arrays for all coefficients; seeded jitter and sizes
+    points = assemble_points(activated_coeffs, max_points=max_points,
+                             size_range=(2, 5), jitter=0.15, seed=42,
+                             method=sample_method)
+
+    # Density of every point from a binned FFT KDE, scaled to [0, 1]:
+    # 'global' pools all coefficients, 'group' normalises each coefficient separately
+    density = point_density(points['value'], points['group'], normalise=density_norm)
+
     # Create a colormap for density (blue to purple)
-    cmap = plt.cm.get_cmap('plasma')
-    
-    for i, coeff in enumerate(activated_coeffs):
-        if coeff['Sample Size'] == 0:
-            continue
-        coeff_df = plot_df[plot_df['Coefficient'] == coeff['Coefficient']]
-        x_pos = i + jitter * (np.random.rand(len(coeff_df)) - 0.5)
-        
-        # Map density to colors
-        colors = cmap(coeff_df['Density'])
-        
-        ax.scatter(
-            x_pos,
-            coeff_df['Value'],
-            s=coeff_df['Size'] * 20,
-            c=colors,
-            alpha=0.5,
-            edgecolors='none',
-            zorder=5
-        )
+    cmap = plt.get_cmap('plasma')
+
+    # One scatter call for every point of every coefficient
+    ax.scatter(
+        points['x'],
+        points['value'],
+        s=points['size'] * 20,
+        c=cmap(density),
+        alpha=0.5,
+        edgecolors='none',
+        zorder=5
+    )
 
     palette = sns.color_palette("crest", n_colors=len(activated_coeffs))
-    sns.violinplot(
-        x='Coefficient',
-        y='Value',
-        data=plot_df,
-        palette=palette,
-        inner=None,
-        cut=0,
-        bw_method=0.25,
-        linewidth=1.5,
-        saturation=0.85,
-        width=1.2,
-        alpha=0.7,
-        ax=ax,
-        zorder=10
-    )
+    # KDE curves of the full posterior samples, reused from .beast_cache
+    shapes = violin_shapes([c['Values'] for c in activated_coeffs], bw_method=0.25, cut=0,
+                           source=source)
+    draw_violins(ax, shapes, labels=points['labels'], width=1.2,
+                 colors=[sns.desaturate(c, 0.85) for c in palette],
+                 alpha=0.7, linewidth=1.5, zorder=10)
 
     for i, coeff in enumerate(activated_coeffs):
         if coeff['Sample Size'] == 0:
@@ -299,38 +219,96 @@ def create_combined_plot(activated_coeffs, output_file):
     cbar.set_label('Point Density', fontsize=10)
     cbar.ax.tick_params(labelsize=9)
 
-    plt.savefig(output_file, dpi=600)
-    plt.close()
-    print(f"Figure saved to: {output_file}")
-    print(f"Total points visualised: {len(plot_df):,}")
+    for path in save_figure(fig, output_files, dpi=dpi):
+        print(f"Figure saved to: {path}")
+    plt.close(fig)
+    print(f"Total points visualised: {points['value'].size:,}")
+
+
+def follow_glm_log(input_file, outfile, interval=300, burnin=0, max_updates=None):
+    """
+    Follow a GLM log while BEAST is still writing it.
+    Every `interval` seconds only the newly appended lines are parsed, the
+    running statistics are updated and the HPD table is rewritten.
+    Quantiles and HPDs come from a bounded reservoir sample per coefficient.
+    """
+    tail = LogTail(input_file, burnin=burnin)
+    summary = GlmRunningSummary()
+    updates = 0
+
+    try:
+        while max_updates is None or updates < max_updates:
+            chunk = tail.read_new()
+            if tail.restarted:
+                summary.reset()
+            if not chunk.empty:
+                summary.update(chunk)
+                export_hpd_table(summary.activated_coeffs(), outfile, verbose=False)
+                print(f"[{time.strftime('%H:%M:%S')}] state {chunk['state'].iloc[-1]:,}: "
+                      f"{summary.n_states:,} samples, +{len(chunk):,} new -> {outfile}")
+            updates += 1
+            if max_updates is None or updates < max_updates:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return summary.activated_coeffs()
+
+
+def process_log_file(input_file, burnin=0, max_points=1500, sample_method='quantile'):
+    """
+    Full pipeline for one log: summary, violin figure (PNG and SVG from a
+    single render), HPD table and diagnostics. Returns the written paths.
+    """
+    base_name = input_file.replace(".log", "")
+    output_plots = [f"{base_name}_violin_plot.png", f"{base_name}_violin_plot.svg"]
+    output_hpd = f"{base_name}_HPD.tsv"
+    output_diag = f"{base_name}_diagnostics.tsv"
+
+    print(f"\n处理文件: {input_file}")
+    activated_coeffs = process_glm_data(input_file, burnin=burnin)
+    create_combined_plot(activated_coeffs, output_plots, max_points=max_points,
+                         sample_method=sample_method, source=input_file)
+    export_hpd_table(activated_coeffs, output_hpd)
+    export_diagnostics(input_file, output_diag, burnin=burnin)
+    return output_plots + [output_hpd, output_diag]
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--follow", metavar="LOG",
+                        help="incrementally summarise a GLM log that is still being written")
+    parser.add_argument("--interval", type=float, default=300,
+                        help="seconds between refreshes in --follow mode (default 300)")
+    parser.add_argument("--burnin", type=int, default=0,
+                        help="discard states <= BURNIN (default 0)")
+    parser.add_argument("--max-points", type=int, default=1500,
+                        help="scatter points drawn per coefficient (default 1500)")
+    parser.add_argument("--sample-method", choices=METHODS, default="quantile",
+                        help="how scatter points are picked (default quantile)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="log files processed in parallel (default: one per file)")
+    args = parser.parse_args()
+
+    if args.follow:
+        output_hpd = f"{args.follow.replace('.log', '')}_HPD.tsv"
+        follow_glm_log(args.follow, output_hpd, args.interval, args.burnin)
+        return
+
     input_files = [
         "H7glm.country.glm.log",
         "nosample_H7glm.country.glm.log"
     ]
-    
-    for input_file in input_files:
-        base_name = input_file.replace(".log", "")
-        
-        output_plot_png = f"{base_name}_violin_plot.png"
-        output_plot_svg = f"{base_name}_violin_plot.svg"
-        output_hpd = f"{base_name}_HPD.tsv"
 
-        print(f"\n处理文件: {input_file}")
-        activated_coeffs = process_glm_data(input_file)
-        
-        create_combined_plot(activated_coeffs, output_plot_png)
-        create_combined_plot(activated_coeffs, output_plot_svg)
-        
-        export_hpd_table(activated_coeffs, output_hpd)
-        
-        print(f"完成处理: {input_file}")
-        print(f"生成的文件:")
-        print(f"- {output_plot_png}")
-        print(f"- {output_plot_svg}")
-        print(f"- {output_hpd}")
+    # Each log is independent: summarise, plot and export them concurrently
+    workers = args.workers or min(len(input_files), os.cpu_count() or 1)
+    render = partial(process_log_file, burnin=args.burnin, max_points=args.max_points,
+                     sample_method=args.sample_method)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for input_file, outputs in zip(input_files, pool.map(render, input_files)):
+            print(f"完成处理: {input_file}")
+            print(f"生成的文件:")
+            for path in outputs:
+                print(f"- {path}")
 
 
 if __name__ == "__main__":
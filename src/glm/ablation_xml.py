@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batch generator of GLM predictor-ablation BEAST XMLs.
+
+Each variant is a predictor set derived from the design matrix of a base GLM
+XML (e.g. H7glm_noGDP.xml):
+
+    drop-one   : every base predictor left out in turn
+    drop-group : origin + destination predictors of one covariate left out
+    split      : only the origin-side, or only the destination-side,
+                 country predictors kept
+    add        : a registry covariate missing from the base added (e.g. GDP)
+
+The base XML is rewritten line by line: the designMatrix block gets the
+variant's predictor columns (base lines are copied verbatim, added ones come
+from the predictor registry), the binomialLikelihood proportion is reset to
+1 - 0.5 ** (1 / K), and output file names are tagged with the variant name.
+Variants are written in parallel and listed in `manifest.tsv`.
+
+Usage: python ablation_xml.py H7glm_noGDP.xml --outdir ablations
+           [--variants drop-one drop-group split add] [--workers N]
+"""
+
+import argparse
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bayes_factors import default_prior_probability
+from predictors import GLM_PREDICTORS, load_registry, route_pairs, xml_design_columns
+
+VARIANT_KINDS = ("drop-one", "drop-group", "split", "add")
+
+_PARAM_RE = re.compile(r'<parameter id="(?P<prefix>[^".]+)\.(?P<name>[^"]+)" value="')
+_FILE_RE = re.compile(r'(fileName|operatorAnalysis)="([^".]+)([^"]*)"')
+
+
+def covariate(name):
+    """
+    Covariate a predictor belongs to: 'air_origin' -> 'air'.
+    """
+    return re.sub(r"_(origin|destination)$", "", name)
+
+
+def variant_sets(base, available, kinds=VARIANT_KINDS):
+    """
+    Ordered {variant name: predictor list} for the requested kinds. `base` is
+    the predictor list of the base XML, `available` every predictor that can
+    be written (in GLM_PREDICTORS order).
+    """
+    base = list(base)
+    variants = {}
+    groups = {}
+    for name in base:
+        groups.setdefault(covariate(name), []).append(name)
+
+    if "drop-one" in kinds:
+        for name in base:
+            variants[f"drop_{name}"] = [p for p in base if p != name]
+    if "drop-group" in kinds:
+        for group, members in groups.items():
+            if len(members) > 1:
+                variants[f"drop_{group}"] = [p for p in base if p not in members]
+    if "split" in kinds:
+        for side, other in (("origin", "destination"), ("destination", "origin")):
+            variants[f"{side}_only"] = [p for p in base if not p.endswith(f"_{other}")]
+    if "add" in kinds:
+        added = {}
+        for name in available:
+            if name not in base and covariate(name) not in groups:
+                added.setdefault(covariate(name), []).append(name)
+        for group, members in added.items():
+            variants[f"add_{group}"] = [p for p in available if p in base or p in members]
+    return variants
+
+
+def format_values(values):
+    """
+    Design-matrix values in the space-separated form BEAUti writes.
+    """
+    return " ".join(np.format_float_positional(v, unique=True, trim="0")
+                    for v in np.asarray(values))
+
+
+def rewrite_xml(base_path, out_path, variant, predictors, added_lines, prefix="country"):
+    """
+    Stream `base_path` to `out_path`, replacing the designMatrix columns by
+    `predictors`, the inclusion prior by its K-predictor default and tagging
+    output file names with `variant`. Returns the SHA-256 of the output.
+    """
+    prior = default_prior_probability(len(predictors))
+    h = hashlib.sha256()
+    tmp = Path(str(out_path) + ".tmp")
+
+    in_design = in_binomial = in_proportion = False
+    columns = {}
+    indent = ""
+    # newline="" keeps the base file's line endings (BEAUti writes CRLF on Windows)
+    with open(base_path, encoding="utf-8", newline="") as src, \
+            open(tmp, "w", encoding="utf-8", newline="") as out:
+        for line in src:
+            if in_design:
+                match = _PARAM_RE.search(line)
+                if match and match.group("prefix") == prefix:
+                    columns[match.group("name")] = line
+                    indent = line[:len(line) - len(line.lstrip())]
+                    continue
+                if "</designMatrix>" in line:
+                    in_design = False
+                    eol = line[len(line.rstrip("\r\n")):]
+                    for name in predictors:
+                        line_out = columns.get(name) or (indent + added_lines[name] + eol)
+                        out.write(line_out)
+                        h.update(line_out.encode("utf-8"))
+            elif f'<designMatrix id="{prefix}.designMatrix">' in line:
+                in_design = True
+            elif "<binomialLikelihood>" in line:
+                in_binomial = True
+            elif in_binomial and "<proportion>" in line:
+                in_proportion = True
+            elif in_proportion and "<parameter value=" in line:
+                line = re.sub(r'value="[^"]*"', f'value="{prior!r}"', line)
+                in_binomial = in_proportion = False
+            elif "fileName=" in line or "operatorAnalysis=" in line:
+                line = _FILE_RE.sub(rf'\1="\2_{variant}\3"', line)
+            out.write(line)
+            h.update(line.encode("utf-8"))
+    os.replace(tmp, out_path)
+    return h.hexdigest()
+
+
+def generate_ablations(base_xml, outdir="ablations", kinds=VARIANT_KINDS, data_dir=".",
+                       predictor_xml=None, workers=None, prefix="country"):
+    """
+    Write every requested variant of `base_xml` to `outdir` and a manifest
+    (`manifest.tsv`) recording each variant's predictor set. Returns the
+    manifest DataFrame.
+    """
+    base_xml = Path(base_xml)
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    base_columns = xml_design_columns(base_xml, prefix)
+    xml_only = [p[0] for p in GLM_PREDICTORS if p[2] == "xml"]
+    if predictor_xml is None and all(n in base_columns for n in xml_only):
+        predictor_xml = base_xml
+    registry = load_registry(data_dir, None if predictor_xml is None else str(predictor_xml))
+
+    unknown = [n for n in base_columns if n not in registry.predictor_index]
+    if unknown:
+        raise ValueError(f"{base_xml}: design-matrix columns {unknown} are not in the registry")
+    base = [n for n in registry.names if n in base_columns]
+    variants = variant_sets(base, registry.names, kinds)
+
+    # Lines for predictors the base lacks, built once from the registry
+    origin, destination = route_pairs(len(registry.countries))
+    added_lines = {}
+    for predictors in variants.values():
+        for name in predictors:
+            if name not in base_columns and name not in added_lines:
+                values = registry.matrix(name)[origin, destination]
+                added_lines[name] = (f'<parameter id="{prefix}.{name}" '
+                                     f'value="{format_values(values)}"/>')
+
+    names = list(variants)
+    paths = [outdir / f"{base_xml.stem}_{name}.xml" for name in names]
+    workers = workers or min(len(names), os.cpu_count() or 1) or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(partial(rewrite_xml, base_xml, added_lines=added_lines,
+                                        prefix=prefix),
+                                paths, names, [variants[n] for n in names]))
+
+    manifest = pd.DataFrame({
+        'Variant': names,
+        'File': [p.name for p in paths],
+        'Predictors': [len(variants[n]) for n in names],
+        'Prior Probability': [default_prior_probability(len(variants[n])) for n in names],
+        'Dropped': [",".join(p for p in base if p not in variants[n]) for n in names],
+        'Added': [",".join(p for p in variants[n] if p not in base) for n in names],
+        'Predictor Set': [",".join(variants[n]) for n in names],
+        'SHA256': digests,
+    })
+    manifest_path = outdir / "manifest.tsv"
+    manifest_path.write_text(manifest.to_csv(sep='\t', index=False), encoding='utf-8')
+    print(f"{len(names)} variants of {base_xml.name} written to: {outdir}")
+    print(f"Manifest written to: {manifest_path}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_xml", help="GLM XML to derive the variants from")
+    parser.add_argument("--outdir", default="ablations")
+    parser.add_argument("--variants", nargs="+", choices=VARIANT_KINDS,
+                        default=list(VARIANT_KINDS))
+    parser.add_argument("--data-dir", default=".", help="folder with the predictor CSVs")
+    parser.add_argument("--predictor-xml", default=None,
+                        help="XML holding the sample-size predictors if the base lacks them")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    manifest = generate_ablations(args.base_xml, args.outdir, args.variants, args.data_dir,
+                                  args.predictor_xml, args.workers)
+    print(manifest[['Variant', 'Predictors', 'Dropped', 'Added']].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
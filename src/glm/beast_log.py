@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Streaming reader for BEAST tab-separated .log files.
+
+The log is read in fixed-size chunks so that burn-in, thinning and column
+selection are applied while parsing; only the retained rows of the requested
+columns are ever held in memory.
+"""
+
+import io
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Column families written by the GLM <log> block of the country model
+GLM_FAMILIES = ("coefficients", "coefIndicators", "coefficientsTimesIndicators")
+
+DEFAULT_CHUNKSIZE = 10_000
+TAIL_BLOCK_SIZE = 1 << 24  # bytes parsed at a time by LogTail
+
+
+def read_log_header(file_path):
+    """
+    Return the column names of a BEAST log (first non-comment line).
+    """
+    with open(file_path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith("#") or not line.strip():
+                continue
+            return line.rstrip("\r\n").split("\t")
+    raise ValueError(f"No header line found in {file_path}")
+
+
+def select_columns(columns, families=GLM_FAMILIES, prefix="country"):
+    """
+    Select `prefix.family<i>` columns for the requested families, ordered by
+    family and then by index. With families=None every column is kept.
+    The 'state' column is always returned first.
+    """
+    if families is None:
+        return ["state"] + [c for c in columns if c != "state"]
+
+    selected = ["state"]
+    for family in families:
+        pattern = re.compile(rf"^{re.escape(prefix)}\.{re.escape(family)}(\d+)$")
+        matched = [(int(m.group(1)), c) for c in columns
+                   if (m := pattern.match(c))]
+        selected += [c for _, c in sorted(matched)]
+    return selected
+
+
+def family_indices(columns, family, prefix="country"):
+    """
+    Sorted 1-based indices present for one column family, e.g. [1, ..., 15].
+    """
+    pattern = re.compile(rf"^{re.escape(prefix)}\.{re.escape(family)}(\d+)$")
+    return sorted(int(m.group(1)) for c in columns if (m := pattern.match(c)))
+
+
+def _data_states(file_path):
+    """
+    First and last logged state, read from the head and tail of the file
+    without scanning the lines in between.
+    """
+    first = None
+    with open(file_path, "r", encoding="utf-8") as fh:
+        header_seen = False
+        for line in fh:
+            if line.startswith("#") or not line.strip():
+                continue
+            if not header_seen:
+                header_seen = True
+                continue
+            first = int(float(line.split("\t", 1)[0]))
+            break
+    if first is None:
+        return None, None
+
+    with open(file_path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        size = fh.tell()
+        block = 1 << 16
+        while True:
+            start = max(0, size - block)
+            fh.seek(start)
+            tail = fh.read(size - start).decode("utf-8", errors="ignore")
+            lines = tail.split("\n")
+            # The final line may still be half-written by a running chain,
+            # and the first one is cut by the seek
+            lines = lines[:-1] if start == 0 else lines[1:-1]
+            for ln in reversed(lines):
+                if not ln.strip() or ln.startswith("#"):
+                    continue
+                try:
+                    return first, int(float(ln.split("\t", 1)[0]))
+                except ValueError:
+                    continue
+            if start == 0:
+                return first, first
+            block *= 4
+
+
+def resolve_burnin(file_path, burnin=0, burnin_frac=None):
+    """
+    Translate the burn-in options into a state threshold.
+    States up to and including the returned value are discarded.
+    `burnin_frac` (0-1) takes precedence over the absolute `burnin` state.
+    """
+    if burnin_frac is None:
+        return burnin
+    if not 0 <= burnin_frac < 1:
+        raise ValueError("burnin_frac must be in [0, 1)")
+    first, last = _data_states(file_path)
+    if first is None:
+        return burnin
+    return max(burnin, int(first + burnin_frac * (last - first)))
+
+
+def iter_log_chunks(file_path, families=GLM_FAMILIES, prefix="country",
+                    burnin=0, burnin_frac=None, thin=1,
+                    chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """
+    Yield DataFrame chunks of a BEAST log with burn-in, thinning and column
+    selection already applied. Peak memory is bounded by `chunksize`.
+
+    burnin      : discard states <= burnin (default 0 drops the initial state)
+    burnin_frac : discard this fraction of the chain, by state
+    thin        : keep every `thin`-th post-burn-in sample
+    columns     : explicit column names to keep instead of `families`
+    """
+    if thin < 1:
+        raise ValueError("thin must be >= 1")
+
+    if columns is None:
+        usecols = select_columns(read_log_header(file_path), families, prefix)
+    else:
+        usecols = ["state"] + [c for c in columns if c != "state"]
+    threshold = resolve_burnin(file_path, burnin, burnin_frac)
+    dtypes = {c: np.float64 for c in usecols[1:]}
+    dtypes["state"] = np.int64
+
+    kept = 0  # post-burn-in samples seen so far, for thinning across chunks
+    reader = pd.read_csv(file_path, sep="\t", comment="#", usecols=usecols,
+                         dtype=dtypes, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk["state"].to_numpy() > threshold]
+        if chunk.empty:
+            continue
+        if thin > 1:
+            offset = (-kept) % thin
+            kept += len(chunk)
+            chunk = chunk.iloc[offset::thin]
+        yield chunk[usecols]
+
+
+def read_log(file_path, families=GLM_FAMILIES, prefix="country",
+             burnin=0, burnin_frac=None, thin=1, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Read a BEAST log into a DataFrame through `iter_log_chunks`.
+    """
+    columns = select_columns(read_log_header(file_path), families, prefix)
+    blocks = [chunk.to_numpy(dtype=np.float64) for chunk in
+              iter_log_chunks(file_path, families, prefix, burnin,
+                              burnin_frac, thin, chunksize)]
+    if blocks:
+        data = np.concatenate(blocks)
+    else:
+        data = np.empty((0, len(columns)))
+    df = pd.DataFrame(data, columns=columns)
+    df["state"] = df["state"].astype(np.int64)
+    return df
+
+
+class LogTail:
+    """
+    Incremental reader for a log that is still being written.
+
+    Remembers the byte offset of the last complete line it parsed; each call
+    to `read_new` parses only lines appended since then. A trailing line
+    without a newline is left for the next call. The bytes since the offset
+    (the whole log on the first call) are read and parsed in blocks of at
+    most `block_size`, so only the selected columns are held in memory.
+    """
+
+    def __init__(self, file_path, families=GLM_FAMILIES, prefix="country",
+                 burnin=0, block_size=TAIL_BLOCK_SIZE):
+        self.file_path = file_path
+        self.families = families
+        self.prefix = prefix
+        self.burnin = burnin
+        self.block_size = block_size
+        self.offset = 0
+        self.columns = None
+        self.usecols = None
+        self.restarted = False  # set when the file shrank since the last read
+
+    def read_new(self):
+        """
+        Return a DataFrame of the complete lines appended since the last call
+        (empty if nothing new), with burn-in and column selection applied.
+        """
+        self.restarted = False
+        chunks = []
+        with open(self.file_path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            if size < self.offset:
+                # Log was truncated or restarted: start over
+                self.offset = 0
+                self.columns = None
+                self.restarted = True
+            fh.seek(self.offset)
+            pending = b""
+            while fh.tell() < size:
+                raw = pending + fh.read(min(self.block_size, size - fh.tell()))
+                end = raw.rfind(b"\n")
+                if end < 0:
+                    pending = raw
+                    continue
+                self.offset += end + 1
+                pending = raw[end + 1:]
+                chunk = self._parse(raw[:end])
+                if chunk is not None:
+                    chunks.append(chunk)
+
+        if not chunks:
+            return self._empty()
+        return pd.concat(chunks, ignore_index=True)
+
+    def _parse(self, raw):
+        """
+        Selected columns of a block of complete lines, or None when it holds
+        no data rows.
+        """
+        lines = [ln for ln in raw.decode("utf-8").splitlines()
+                 if ln.strip() and not ln.startswith("#")]
+
+        if self.columns is None:
+            if not lines:
+                return None
+            self.columns = lines.pop(0).split("\t")
+            self.usecols = select_columns(self.columns, self.families, self.prefix)
+        if not lines:
+            return None
+
+        chunk = pd.read_csv(io.StringIO("\n".join(lines)), sep="\t", header=None,
+                            names=self.columns, usecols=self.usecols)
+        chunk = chunk[chunk["state"].to_numpy() > self.burnin]
+        return chunk[self.usecols].reset_index(drop=True)
+
+    def _empty(self):
+        return pd.DataFrame(columns=self.usecols or ["state"])
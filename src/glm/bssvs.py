@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Bayes factors of the BSSVS rate indicators of discrete trait models
+(continent, host, ...), computed from the <trait>.rates.log files.
+
+Each log is streamed in chunks and only the running sum of every
+`<trait>.indicators<i>` column is kept. The posterior probability PP of a
+rate is the frequency of its indicator; the prior comes from the XML: a
+Poisson prior with mean lambda and offset on the number of non-zero rates
+gives each of the K indicators a prior probability
+q = (lambda + offset) / K, and BF = PP / (1 - PP) / (q / (1 - q)).
+
+The XML also gives the states (in order), the number of indicators (K(K-1)/2
+for a symmetric model, K(K-1) for an asymmetric one) and which log belongs to
+which trait (the fileName of its <log id="...rateMatrixLog">). Any number of
+logs is processed in parallel and written as one tidy table (label, trait,
+origin, destination, BF, PP); the rate of a symmetric model is listed in both
+directions.
+
+Usage: python bssvs.py LOG [LOG ...] --xml XML [XML ...] [--labels H7 H7N3 ...]
+           [--burnin-frac 0.1] [-o bssvs.tsv] [--workers N]
+"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bayes_factors import bayes_factors
+from beast_log import family_indices, iter_log_chunks, read_log_header
+from predictors import route_pairs
+
+RATE_LOG = re.compile(r'<log id="[^"]*?\.?([^".]+)rateMatrixLog"[^>]*fileName="([^"]+)"')
+
+SUPPORT_COLUMNS = ["label", "trait", "origin", "destination", "BF", "PP"]
+
+
+class RateModel:
+    """
+    BSSVS setup of one discrete trait, as read from a BEAST XML.
+    """
+
+    def __init__(self, trait, states, n_indicators, poisson_mean, poisson_offset):
+        self.trait = trait
+        self.states = states
+        self.n_indicators = n_indicators
+        self.poisson_mean = poisson_mean
+        self.poisson_offset = poisson_offset
+
+    @property
+    def symmetric(self):
+        return self.n_indicators == len(self.states) * (len(self.states) - 1) // 2
+
+    @property
+    def prior_probability(self):
+        return (self.poisson_mean + self.poisson_offset) / self.n_indicators
+
+    def pairs(self):
+        """
+        (origin, destination) state indices of the indicators in log order.
+        """
+        origin, destination = route_pairs(len(self.states))
+        return origin[:self.n_indicators], destination[:self.n_indicators]
+
+
+def trait_states(text, trait="continent"):
+    """
+    State codes of `trait`, in data type order, from the text of a BEAST XML
+    (None when the XML has no data type for it).
+    """
+    data_type = re.search(rf'<generalDataType id="{re.escape(trait)}\.dataType">(.*?)'
+                          r'</generalDataType>', text, re.DOTALL)
+    if data_type is None:
+        return None
+    return re.findall(r'<state code="([^"]+)"', data_type.group(1))
+
+
+def rate_model_from_xml(xml_path, trait="continent"):
+    """
+    States, indicator count and Poisson prior of `trait` in a BEAST XML.
+    """
+    text = Path(xml_path).read_text(encoding="utf-8")
+    t = re.escape(trait)
+    states = trait_states(text, trait)
+    dimension = re.search(rf'<parameter id="{t}\.indicators" dimension="(\d+)"', text)
+    prior = re.search(rf'<poissonPrior mean="([^"]+)" offset="([^"]+)">\s*'
+                      rf'<statistic idref="{t}\.nonZeroRates"/>', text)
+    if states is None or dimension is None or prior is None:
+        raise ValueError(f"No BSSVS model for trait '{trait}' in {xml_path}")
+    model = RateModel(trait, states, int(dimension.group(1)),
+                      float(prior.group(1)), float(prior.group(2)))
+    n = len(states)
+    if model.n_indicators not in (n * (n - 1) // 2, n * (n - 1)):
+        raise ValueError(f"{model.n_indicators} indicators do not fit {n} states "
+                         f"of '{trait}' in {xml_path}")
+    return model
+
+
+def rate_logs_in_xml(xml_path):
+    """
+    {log file name: trait} of the rateMatrixLog blocks of a BEAST XML.
+    """
+    text = Path(xml_path).read_text(encoding="utf-8")
+    return {file_name: trait for trait, file_name in RATE_LOG.findall(text)}
+
+
+def match_log(log_path, xml_paths):
+    """
+    (xml path, trait) of the XML whose rateMatrixLog writes `log_path`.
+    """
+    name = Path(log_path).name
+    for xml_path in xml_paths:
+        trait = rate_logs_in_xml(xml_path).get(name)
+        if trait is not None:
+            return xml_path, trait
+    raise ValueError(f"No rateMatrixLog writing {name} in {', '.join(map(str, xml_paths))}")
+
+
+def indicator_frequencies(log_path, trait, burnin=0, burnin_frac=None):
+    """
+    Posterior frequency of every `<trait>.indicators<i>` column (in index
+    order) and the number of samples, from one pass over the log.
+    """
+    indices = family_indices(read_log_header(log_path), "indicators", trait)
+    if not indices:
+        raise ValueError(f"No {trait}.indicators columns in {log_path}")
+    totals = np.zeros(len(indices))
+    n_samples = 0
+    for chunk in iter_log_chunks(log_path, families=("indicators",), prefix=trait,
+                                 burnin=burnin, burnin_frac=burnin_frac):
+        totals += (chunk.iloc[:, 1:].to_numpy() == 1.0).sum(axis=0)
+        n_samples += len(chunk)
+    if not n_samples:
+        raise ValueError(f"No samples left in {log_path} after burn-in")
+    return totals / n_samples, n_samples
+
+
+def support_table(log_path, model, label=None, burnin=0, burnin_frac=None):
+    """
+    Tidy BF / PP table of every rate of one log.
+    """
+    pp, n_samples = indicator_frequencies(log_path, model.trait, burnin, burnin_frac)
+    if len(pp) != model.n_indicators:
+        raise ValueError(f"{log_path} has {len(pp)} {model.trait} indicators, "
+                         f"the XML model {model.n_indicators}")
+    bf, _ = bayes_factors(pp, model.prior_probability, n_samples)
+    origin, destination = model.pairs()
+    if model.symmetric:
+        origin, destination = (np.concatenate([origin, destination]),
+                               np.concatenate([destination, origin]))
+        pp, bf = np.tile(pp, 2), np.tile(bf, 2)
+    states = np.array(model.states)
+    return pd.DataFrame({"label": label or Path(log_path).name.split(".")[0],
+                         "trait": model.trait, "origin": states[origin],
+                         "destination": states[destination], "BF": bf, "PP": pp},
+                        columns=SUPPORT_COLUMNS)
+
+
+def _support_task(args):
+    log_path, xml_paths, label, burnin, burnin_frac = args
+    xml_path, trait = match_log(log_path, xml_paths)
+    return support_table(log_path, rate_model_from_xml(xml_path, trait), label,
+                         burnin, burnin_frac)
+
+
+def bssvs_support(log_paths, xml_paths, labels=None, burnin=0, burnin_frac=None,
+                  workers=None):
+    """
+    Support table of all logs, computed over a process pool.
+    """
+    labels = labels or [None] * len(log_paths)
+    if len(labels) != len(log_paths):
+        raise ValueError("Give one label per log")
+    workers = min(workers or os.cpu_count() or 1, len(log_paths))
+    tasks = [(log, list(xml_paths), label, burnin, burnin_frac)
+             for log, label in zip(log_paths, labels)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tables = list(pool.map(_support_task, tasks))
+    return pd.concat(tables, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="<trait>.rates.log files")
+    parser.add_argument("--xml", nargs="+", required=True,
+                        help="BEAST XMLs that wrote the logs")
+    parser.add_argument("--labels", nargs="+", default=None,
+                        help="label of each log (default: its file name up to the first '.')")
+    parser.add_argument("--burnin", type=int, default=0)
+    parser.add_argument("--burnin-frac", type=float, default=None)
+    parser.add_argument("-o", "--output", default="bssvs.tsv", help="output table")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    table = bssvs_support(args.logs, args.xml, args.labels, args.burnin, args.burnin_frac,
+                          args.workers)
+    table.to_csv(args.output, sep="\t", index=False)
+    print(f"Support table written to: {args.output}")
+    print(table.to_string(index=False, float_format='{:,.4f}'.format))
+
+
+if __name__ == "__main__":
+    main()
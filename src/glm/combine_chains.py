@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+LogCombiner-style merging of independent BEAST chains with Gelman-Rubin R-hat.
+
+Each chain is read (burn-in removed) in its own worker process, R-hat is
+computed for every parameter, and the thinned, merged samples are written as
+a columnar .npy file that `process_glm_data` and the violin scripts load
+directly in place of a .log file.
+
+Usage: python combine_chains.py OUT.npy CHAIN1.log CHAIN2.log [...]
+           [--burnin STATE | --burnin-frac F] [--thin N]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from beast_log import GLM_FAMILIES
+from log_cache import cached_read_log, save_columnar
+
+
+def _read_chain(file_path, families, prefix, burnin, burnin_frac, thin):
+    """
+    Worker: one chain with burn-in and thinning applied, as a plain array.
+    """
+    df = cached_read_log(file_path, families=families, prefix=prefix,
+                         burnin=burnin, burnin_frac=burnin_frac, thin=thin)
+    return list(df.columns), df.to_numpy(dtype=np.float64)
+
+
+def gelman_rubin(chains):
+    """
+    Potential scale reduction factor (R-hat) for every parameter.
+
+    chains : sequence of (states x params) arrays; they are truncated to the
+             shortest chain. Parameters with no within-chain variance give NaN.
+    """
+    n = min(len(c) for c in chains)
+    if len(chains) < 2 or n < 2:
+        return np.full(chains[0].shape[1], np.nan)
+    x = np.stack([c[:n] for c in chains])  # chains x states x params
+
+    chain_means = x.mean(axis=1)
+    within = x.var(axis=1, ddof=1).mean(axis=0)
+    between = n * chain_means.var(axis=0, ddof=1)
+    pooled = (n - 1) / n * within + between / n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(within > 0, np.sqrt(pooled / within), np.nan)
+
+
+def combine_chains(log_paths, outfile, families=GLM_FAMILIES, prefix="country",
+                   burnin=0, burnin_frac=None, thin=1, workers=None):
+    """
+    Read `log_paths` in a process pool, compute R-hat, and write the merged
+    chains to `outfile` (.npy + .json sidecar) and `<outfile>_rhat.tsv`.
+    States are renumbered consecutively as LogCombiner does.
+    Returns (merged DataFrame, R-hat table).
+    """
+    reader = partial(_read_chain, families=families, prefix=prefix, burnin=burnin,
+                     burnin_frac=burnin_frac, thin=thin)
+    workers = workers or min(len(log_paths), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(reader, log_paths))
+
+    columns = results[0][0]
+    for path, (cols, _) in zip(log_paths, results):
+        if cols != columns:
+            raise ValueError(f"{path} does not have the same columns as {log_paths[0]}")
+
+    state_idx = columns.index("state")
+    params = [c for c in columns if c != "state"]
+    chains = [np.delete(data, state_idx, axis=1) for _, data in results]
+
+    rhat = pd.DataFrame({
+        'Parameter': params,
+        'R-hat': gelman_rubin(chains),
+        'Chains': len(chains),
+        'Samples per Chain': min(len(c) for c in chains),
+    })
+
+    # LogCombiner renumbers states with the (thinned) logging interval
+    first = results[0][1][:, state_idx]
+    step = int(first[1] - first[0]) if len(first) > 1 else 1
+    merged = pd.DataFrame(np.concatenate(chains), columns=params)
+    merged.insert(0, "state", np.arange(1, len(merged) + 1, dtype=np.int64) * step)
+
+    outfile = Path(outfile).with_suffix(".npy")
+    save_columnar(merged, outfile, sources=[str(p) for p in log_paths],
+                  burnin=burnin, burnin_frac=burnin_frac, thin=thin)
+    rhat_file = outfile.with_name(f"{outfile.stem}_rhat.tsv")
+    rhat_file.write_text(rhat.to_csv(sep='\t', index=False), encoding='utf-8')
+
+    worst = rhat['R-hat'].max()
+    print(f"Combined {len(chains)} chains, {len(merged):,} samples -> {outfile}")
+    print(f"R-hat written to: {rhat_file} (max {worst:.3f})")
+    return merged, rhat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("outfile", help="merged output (.npy)")
+    parser.add_argument("logs", nargs="+", help="chain .log files")
+    parser.add_argument("--burnin", type=int, default=0,
+                        help="per-chain burn-in: discard states <= BURNIN (default 0)")
+    parser.add_argument("--burnin-frac", type=float, default=None,
+                        help="per-chain burn-in as a fraction of each chain")
+    parser.add_argument("--thin", type=int, default=1,
+                        help="keep every THIN-th sample of each chain")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="combine every log column, not only the GLM families")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    combine_chains(args.logs, args.outfile,
+                   families=None if args.all_columns else GLM_FAMILIES,
+                   burnin=args.burnin, burnin_frac=args.burnin_frac,
+                   thin=args.thin, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convergence diagnostics for every column of a BEAST log.
+
+Autocorrelations of all columns are computed together with one real FFT,
+from which the integrated autocorrelation time (Geyer's initial monotone
+sequence), the effective sample size and Geweke z-scores are derived.
+
+Usage: python diagnostics.py LOG [LOG ...] [--burnin-frac 0.1]
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from log_cache import load_log
+
+
+def autocorrelation(samples, max_lag=None):
+    """
+    Normalised autocorrelation of each column of a (states x params) matrix,
+    via FFT with zero padding. Constant columns give NaN.
+    Returns an array of shape (max_lag, params).
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    n = x.shape[0]
+    max_lag = n if max_lag is None else min(max_lag, n)
+
+    x = x - x.mean(axis=0)
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    f = np.fft.rfft(x, n=size, axis=0)
+    acov = np.fft.irfft(f * np.conj(f), n=size, axis=0)[:max_lag] / n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return acov / acov[0]
+
+
+def integrated_autocorrelation_time(samples):
+    """
+    Integrated autocorrelation time of each column, using Geyer's initial
+    monotone sequence estimator on the FFT autocorrelation.
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    n = x.shape[0]
+    if n < 4:
+        return np.full(x.shape[1], np.nan)
+
+    rho = autocorrelation(x)
+    n_pairs = n // 2
+    pairs = rho[0:2 * n_pairs:2] + rho[1:2 * n_pairs:2]
+
+    # Truncate each column at its first non-positive pair sum, then make the
+    # remaining sequence monotone non-increasing
+    positive = pairs > 0
+    first_bad = np.where(positive.all(axis=0), n_pairs, np.argmin(positive, axis=0))
+    keep = np.arange(n_pairs)[:, None] < first_bad
+    monotone = np.minimum.accumulate(np.where(keep, pairs, np.inf), axis=0)
+    tau = -1 + 2 * np.where(keep, monotone, 0).sum(axis=0)
+
+    tau = np.maximum(tau, 1 / np.log10(n))
+    constant = ~np.isfinite(rho[0])
+    tau[constant] = np.nan
+    return tau
+
+
+def effective_sample_size(samples):
+    """
+    ESS = N / IACT for each column.
+    """
+    n = np.asarray(samples).shape[0]
+    return n / integrated_autocorrelation_time(samples)
+
+
+def geweke_z(samples, first=0.1, last=0.5):
+    """
+    Geweke z-score comparing the mean of the first `first` fraction of the
+    chain with the last `last` fraction. The variance of each segment mean is
+    var / (n / IACT), i.e. the spectral density at zero.
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    n = x.shape[0]
+    a = x[: int(first * n)]
+    b = x[n - int(last * n):]
+    if len(a) < 4 or len(b) < 4:
+        return np.full(x.shape[1], np.nan)
+
+    var_a = a.var(axis=0) * integrated_autocorrelation_time(a) / len(a)
+    var_b = b.var(axis=0) * integrated_autocorrelation_time(b) / len(b)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (a.mean(axis=0) - b.mean(axis=0)) / np.sqrt(var_a + var_b)
+
+
+def diagnostics_table(df):
+    """
+    ESS, IACT and Geweke z for every column of a log DataFrame except 'state'.
+    """
+    columns = [c for c in df.columns if c != "state"]
+    x = df[columns].to_numpy(dtype=np.float64)
+    tau = integrated_autocorrelation_time(x)
+    return pd.DataFrame({
+        'Parameter': columns,
+        'Mean': x.mean(axis=0),
+        'Std': x.std(axis=0),
+        'Samples': len(x),
+        'ESS': len(x) / tau,
+        'IACT': tau,
+        'Geweke Z': geweke_z(x),
+    })
+
+
+def export_diagnostics(file_path, outfile=None, burnin=0, burnin_frac=None,
+                       families=None, prefix="country"):
+    """
+    Compute diagnostics for one log and write them to `<log>_diagnostics.tsv`
+    (next to the `<log>_HPD.tsv` table). Returns the table.
+    """
+    df = load_log(file_path, families=families, prefix=prefix,
+                  burnin=burnin, burnin_frac=burnin_frac)
+    table = diagnostics_table(df)
+    if outfile is None:
+        outfile = f"{Path(file_path).with_suffix('')}_diagnostics.tsv"
+    Path(outfile).write_text(table.to_csv(sep='\t', index=False), encoding='utf-8')
+
+    low_ess = table[table['ESS'] < 200]
+    print(f"Diagnostics written to: {outfile} "
+          f"({len(table)} columns, {len(low_ess)} with ESS < 200)")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="BEAST .log files")
+    parser.add_argument("--burnin", type=int, default=0,
+                        help="discard states <= BURNIN (default 0)")
+    parser.add_argument("--burnin-frac", type=float, default=None,
+                        help="discard this fraction of each chain instead")
+    args = parser.parse_args()
+
+    for log in args.logs:
+        export_diagnostics(log, burnin=args.burnin, burnin_frac=args.burnin_frac)
+
+
+if __name__ == "__main__":
+    main()
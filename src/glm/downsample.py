@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Downsampling of posterior samples for scatter layers.
+
+All strategies pick `k` of `n` samples in O(n) and return the indices in
+chain order:
+
+    quantile  : k equal-probability strata of the value distribution, one
+                random sample from each, so tails keep their share of points
+    reservoir : bottom-k of random priorities (a uniform sample that can be
+                merged across chunks, like running_stats.ReservoirSketch)
+    random    : uniform sample without replacement from a seeded generator
+    even      : evenly spaced positions along the chain (the old behaviour)
+"""
+
+import numpy as np
+
+METHODS = ("quantile", "reservoir", "random", "even")
+
+# Quantile edges are estimated from at most this many samples per stratum
+EDGE_SAMPLES_PER_STRATUM = 64
+
+
+def _quantile_indices(values, k, rng):
+    n = values.size
+    m = min(n, EDGE_SAMPLES_PER_STRATUM * k)
+    probe = values if m == n else values[rng.choice(n, m, replace=False)]
+    edges = np.quantile(probe, np.linspace(0, 1, k + 1)[1:-1])
+    # A value equal to several edges (ties, e.g. an atom at zero) is spread
+    # uniformly over all the strata it spans
+    left = np.searchsorted(edges, values, side="left")
+    right = np.searchsorted(edges, values, side="right")
+    stratum = left + (rng.random(n) * (right - left + 1)).astype(np.int64)
+
+    # One sample per stratum: the member with the smallest random priority
+    priority = rng.random(n)
+    best = np.full(k, np.inf)
+    np.minimum.at(best, stratum, priority)
+    return np.flatnonzero(priority == best[stratum])
+
+
+def downsample_indices(values, k, method="quantile", seed=42):
+    """
+    Indices (ascending) of at most `k` samples of the 1-D array `values`.
+    The quantile strategy can return slightly fewer than k when a stratum
+    ends up empty.
+    """
+    values = np.asarray(values)
+    n = values.size
+    if k >= n:
+        return np.arange(n)
+    if k <= 0:
+        return np.arange(0)
+    rng = np.random.default_rng(seed)
+
+    if method == "quantile":
+        return _quantile_indices(values, k, rng)
+    if method == "reservoir":
+        return np.sort(np.argpartition(rng.random(n), k - 1)[:k])
+    if method == "random":
+        return np.sort(rng.choice(n, k, replace=False))
+    if method == "even":
+        return np.linspace(0, n - 1, k, dtype=int)
+    raise ValueError(f"method must be one of {METHODS}")
+
+
+def downsample(values, k, method="quantile", seed=42):
+    """
+    At most `k` samples of `values`, in chain order.
+    """
+    values = np.asarray(values)
+    return values[downsample_indices(values, k, method, seed)]
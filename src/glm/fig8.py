@@ -4,6 +4,9 @@ import seaborn as sns
 from matplotlib import rcParams
 import matplotlib.gridspec as gridspec
 
+from bayes_factors import export_support_table, glm_support_table
+from log_cache import load_log
+
 # =====================
 # NATURE STYLE SETTINGS
 # =====================
@@ -24,45 +27,38 @@ plt.rcParams.update({
 })
 
 # ======================
+# Support table computed from the raw GLM log (replaces GLMresult2.xlsx)
 # ======================
-coeff_df = pd.read_excel("GLMresult2.xlsx", sheet_name="coefficient")
-prob_df = pd.read_excel("GLMresult2.xlsx", sheet_name="inclusionprobability")
-
-coeff_df['Indicator'] = coeff_df['Indicator'].replace({
-    'air passenger origin': 'Air Passenger (o)',
-    'air passenger destination': 'Air Passenger (d)',
-    'chickenstock origin': 'Chicken Stock (o)',
-    'chickenstock destination': 'Chicken Stock (d)',
-    'GDPper origin': 'GDP Per Capita (o)',
-    'GDPper destination': 'GDP Per Capita (d)',
-    'rainfall origin': 'Rainfall (o)',
-    'rainfall destination': 'Rainfall (d)',
-    'migration': 'Migration',
-    'trade weight': 'Trade Weight',
-    'temperature origin': 'Temperature (o)',
-    'temperature destination': 'Temperature (d)',
-    'sample size origin': 'Sample Size (o)',
-    'sample size destination': 'Sample Size (d)',
-    'distance': 'Distance'
-})
-
-prob_df['Indicator'] = prob_df['Indicator'].replace({
-    'air passenger origin': 'Air Passenger (o)',
-    'air passenger destination': 'Air Passenger (d)',
-    'chickenstock origin': 'Chicken Stock (o)',
-    'chickenstock destination': 'Chicken Stock (d)',
-    'GDPper origin': 'GDP Per Capita (o)',
-    'GDPper destination': 'GDP Per Capita (d)',
-    'rainfall origin': 'Rainfall (o)',
-    'rainfall destination': 'Rainfall (d)',
-    'migration': 'Migration',
-    'trade weight': 'Trade Weight',
-    'temperature origin': 'Temperature (o)',
-    'temperature destination': 'Temperature (d)',
-    'sample size origin': 'Sample Size (o)',
-    'sample size destination': 'Sample Size (d)',
-    'distance': 'Distance'
-})
+LOG_PATH = "H7glm.country.glm.log"
+BURN_IN_FRAC = 0.10
+SUPPORT_TABLE = "H7glm.country.glm_support.tsv"
+
+INDICATOR_NAMES = {
+    1: 'Air Passenger (o)',
+    2: 'Air Passenger (d)',
+    3: 'Chicken Stock (o)',
+    4: 'Chicken Stock (d)',
+    5: 'Distance',
+    6: 'GDP Per Capita (o)',
+    7: 'GDP Per Capita (d)',
+    8: 'Rainfall (o)',
+    9: 'Rainfall (d)',
+    10: 'Migration',
+    11: 'Trade Weight',
+    12: 'Temperature (o)',
+    13: 'Temperature (d)',
+    14: 'Sample Size (o)',
+    15: 'Sample Size (d)'
+}
+
+support = glm_support_table(load_log(LOG_PATH, burnin_frac=BURN_IN_FRAC),
+                            names=INDICATOR_NAMES)
+export_support_table(support, SUPPORT_TABLE)
+
+coeff_df = support[['Indicator', 'Coefficient', 'HPD Lower', 'HPD Upper']].rename(
+    columns={'HPD Lower': 'HPD_lower', 'HPD Upper': 'HPD_upper'})
+prob_df = support[['Indicator', 'Inclusion Probability']].rename(
+    columns={'Inclusion Probability': 'inclusion_probability'})
 
 # ==========================
 # ==========================
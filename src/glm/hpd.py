@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batched HPD intervals and summary statistics for posterior samples.
+
+All parameters of a log are summarised together: each column is sorted once
+and every credible mass, quantile and moment is read from that sorted copy.
+"""
+
+import numpy as np
+
+from beast_log import family_indices
+
+DEFAULT_CRED_MASSES = (0.5, 0.8, 0.95)
+
+
+def _as_masked_matrix(samples, mask=None):
+    """
+    Return a float (states x params) matrix with excluded entries set to NaN,
+    plus the number of included samples per column.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    if mask is None:
+        return samples, np.full(samples.shape[1], samples.shape[0])
+    mask = np.asarray(mask, dtype=bool).reshape(samples.shape)
+    return np.where(mask, samples, np.nan), mask.sum(axis=0)
+
+
+def _sorted_quantile(sorted_samples, n, q):
+    """
+    Linear-interpolated quantile of each column of a NaN-padded sorted matrix,
+    matching np.percentile's default method. Columns with n == 0 give NaN.
+    """
+    if sorted_samples.shape[0] == 0:
+        return np.full(sorted_samples.shape[1], np.nan)
+    cols = np.arange(sorted_samples.shape[1])
+    pos = np.maximum(n - 1, 0) * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    frac = pos - lo
+    out = (sorted_samples[lo, cols] * (1 - frac)
+           + sorted_samples[hi, cols] * frac)
+    return np.where(n > 0, out, np.nan)
+
+
+def _sorted_hpd(sorted_samples, n, cred_mass):
+    """
+    Shortest interval containing `cred_mass` of each sorted column.
+    Falls back to equal-tailed quantiles when a column is too short.
+    """
+    n_rows, n_cols = sorted_samples.shape
+    if n_rows == 0:
+        return np.full(n_cols, np.nan), np.full(n_cols, np.nan)
+    cols = np.arange(n_cols)
+    k = np.floor(cred_mass * n).astype(np.int64)
+
+    # width[i, j] = x[i + k_j, j] - x[i, j], valid for i < n_j - k_j
+    start = np.arange(n_rows)[:, None]
+    end = np.minimum(start + k, n_rows - 1)
+    width = np.take_along_axis(sorted_samples, end, axis=0) - sorted_samples
+    width[start >= (n - k)] = np.inf
+    best = np.argmin(width, axis=0)
+
+    lower = sorted_samples[best, cols]
+    upper = sorted_samples[np.minimum(best + k, n_rows - 1), cols]
+
+    short = k < 1
+    if short.any():
+        lower[short] = _sorted_quantile(sorted_samples, n, (1 - cred_mass) / 2)[short]
+        upper[short] = _sorted_quantile(sorted_samples, n, (1 + cred_mass) / 2)[short]
+    empty = n == 0
+    lower[empty] = upper[empty] = np.nan
+    return lower, upper
+
+
+def hpd_intervals(samples, mask=None, cred_masses=DEFAULT_CRED_MASSES):
+    """
+    HPD bounds for every column of a (states x params) matrix.
+
+    mask : optional boolean matrix of the same shape; only True entries are
+           used (e.g. coefficient values where the indicator is on)
+    Returns (lower, upper), each of shape (len(cred_masses), n_params).
+    """
+    values, n = _as_masked_matrix(samples, mask)
+    sorted_samples = np.sort(values, axis=0)  # NaN (masked) sorts last
+    bounds = [_sorted_hpd(sorted_samples, n, m) for m in cred_masses]
+    lower = np.array([b[0] for b in bounds])
+    upper = np.array([b[1] for b in bounds])
+    return lower, upper
+
+
+def summarise_samples(samples, mask=None, cred_masses=DEFAULT_CRED_MASSES):
+    """
+    One-pass summary of every column: sample size, mean, median, std,
+    2.5/97.5 % quantiles and HPD bounds for each credible mass.
+    Returns a dict of 1-D arrays; HPD bounds are keyed by mass.
+    """
+    values, n = _as_masked_matrix(samples, mask)
+    sorted_samples = np.sort(values, axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = np.nansum(values, axis=0)
+        mean = np.where(n > 0, total / n, np.nan)
+        sq = np.nansum((values - mean) ** 2, axis=0)
+        std = np.where(n > 0, np.sqrt(sq / n), np.nan)
+
+    summary = {
+        "n": n,
+        "mean": mean,
+        "median": _sorted_quantile(sorted_samples, n, 0.5),
+        "std": std,
+        "q025": _sorted_quantile(sorted_samples, n, 0.025),
+        "q975": _sorted_quantile(sorted_samples, n, 0.975),
+        "hpd": {},
+    }
+    for m in cred_masses:
+        summary["hpd"][m] = _sorted_hpd(sorted_samples, n, m)
+    return summary
+
+
+def compute_hpd(samples: np.ndarray, cred_mass: float = 0.95):
+    """
+    Calculate the 1D HPD interval (Highest Posterior Density) for given samples.
+    Returns (nan, nan) if sample size is 0.
+    """
+    lower, upper = hpd_intervals(np.ravel(samples), cred_masses=(cred_mass,))
+    return lower[0, 0], upper[0, 0]
+
+
+def summarise_glm_coefficients(df, names=None, prefix="country",
+                               cred_masses=DEFAULT_CRED_MASSES):
+    """
+    Indicator-conditioned summaries for every GLM coefficient of a log
+    DataFrame, in the per-coefficient dict layout used by the figure scripts.
+    `names` maps the 1-based coefficient index to a label (default β<i>).
+    """
+    indices = family_indices(df.columns, "coefficients", prefix)
+    coeffs = df[[f"{prefix}.coefficients{i}" for i in indices]].to_numpy()
+    active = df[[f"{prefix}.coefIndicators{i}" for i in indices]].to_numpy() == 1.0
+
+    masses = tuple(sorted(set(cred_masses) | {0.95}))
+    stats = summarise_samples(coeffs, active, masses)
+    n_states = len(df)
+
+    activated_coeffs = []
+    for j, i in enumerate(indices):
+        entry = {
+            'Coefficient': names[i] if names else f'β{i}',
+            'Values': coeffs[active[:, j], j],
+            'Activation Rate': stats['n'][j] / n_states if n_states else np.nan,
+            'Mean': stats['mean'][j],
+            'Median': stats['median'][j],
+            'Std': stats['std'][j],
+            '95% CI Lower': stats['q025'][j],
+            '95% CI Upper': stats['q975'][j],
+            'HPD Lower': stats['hpd'][0.95][0][j],
+            'HPD Upper': stats['hpd'][0.95][1][j],
+            'Sample Size': int(stats['n'][j])
+        }
+        for m in masses:
+            if m != 0.95:
+                entry[f'HPD {m:.0%} Lower'] = stats['hpd'][m][0][j]
+                entry[f'HPD {m:.0%} Upper'] = stats['hpd'][m][1][j]
+        activated_coeffs.append(entry)
+    return activated_coeffs
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Content-addressed columnar cache for parsed BEAST logs.
+
+A parsed (burn-in stripped, thinned, column-selected) log is stored once as a
+column-major .npy matrix plus a JSON sidecar with the column names. Later
+loads memory-map the matrix, so every column is a zero-copy contiguous view.
+Matrices streamed row by row (`ColumnarWriter`) are stored column-major too.
+
+Entries are keyed by the SHA-256 of the log contents together with the reader
+options; when a log changes, its older entries are removed on the next load.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from beast_log import GLM_FAMILIES, read_log
+
+CACHE_DIR_NAME = ".beast_cache"
+CACHE_VERSION = 1
+TRANSPOSE_BLOCK_BYTES = 1 << 26  # rows copied at a time by ColumnarWriter.close
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """
+    SHA-256 hex digest of a file, read in blocks.
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        while block := fh.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+def save_columnar(df, data_path, **meta):
+    """
+    Write a numeric DataFrame as a column-major .npy matrix with a JSON
+    sidecar holding the column names and any extra metadata.
+    """
+    data_path = Path(data_path)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    matrix = np.asfortranarray(df.to_numpy(dtype=np.float64))
+
+    tmp = data_path.with_name(data_path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        np.save(fh, matrix)
+    os.replace(tmp, data_path)
+
+    sidecar = dict(meta, columns=list(df.columns), version=CACHE_VERSION)
+    _meta_path(data_path).write_text(json.dumps(sidecar, indent=1), encoding="utf-8")
+
+
+class ColumnarWriter:
+    """
+    Stream row blocks into a column-major .npy matrix readable by
+    `load_columnar` without holding the whole matrix in memory. Rows are
+    appended to a temporary file; `close` copies them, `block_rows` at a
+    time, into the column-major layout `save_columnar` writes (so every
+    column of the result is contiguous on disk) and writes the JSON sidecar.
+
+        with ColumnarWriter(path, columns) as writer:
+            for block in blocks:
+                writer.write(block)
+    """
+
+    def __init__(self, data_path, columns, block_rows=None, **meta):
+        self.data_path = Path(data_path)
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = list(columns)
+        self.meta = meta
+        self.block_rows = block_rows or max(1, TRANSPOSE_BLOCK_BYTES // (8 * len(self.columns)))
+        self.n_rows = 0
+        self._raw_path = self.data_path.with_name(self.data_path.name + ".rows")
+        self._raw = open(self._raw_path, "wb")
+
+    def write(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] != len(self.columns):
+            raise ValueError(f"expected rows with {len(self.columns)} columns, "
+                             f"got shape {rows.shape}")
+        self._raw.write(rows.tobytes())
+        self.n_rows += rows.shape[0]
+
+    def close(self):
+        if self._raw.closed:
+            return
+        self._raw.close()
+        shape = (self.n_rows, len(self.columns))
+        tmp = self.data_path.with_name(self.data_path.name + ".tmp")
+        if self.n_rows:
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=shape,
+                                            fortran_order=True)
+            rows = np.memmap(self._raw_path, dtype=np.float64, mode="r", shape=shape)
+            for start in range(0, self.n_rows, self.block_rows):
+                out[start:start + self.block_rows] = rows[start:start + self.block_rows]
+            out.flush()
+            del out, rows
+        else:
+            with open(tmp, "wb") as fh:
+                np.save(fh, np.empty(shape, order="F"))
+        os.replace(tmp, self.data_path)
+        self._raw_path.unlink()
+
+        sidecar = dict(self.meta, columns=self.columns, version=CACHE_VERSION)
+        _meta_path(self.data_path).write_text(json.dumps(sidecar, indent=1), encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._raw.close()
+            self._raw_path.unlink(missing_ok=True)
+
+
+def load_columnar(data_path):
+    """
+    Memory-map a matrix written by `save_columnar` and wrap it in a DataFrame
+    without copying the value columns.
+    """
+    data_path = Path(data_path)
+    meta = json.loads(_meta_path(data_path).read_text(encoding="utf-8"))
+    matrix = np.load(data_path, mmap_mode="r")
+    df = pd.DataFrame(matrix, columns=meta["columns"], copy=False)
+    if "state" in df.columns:
+        df["state"] = df["state"].astype(np.int64)
+    return df
+
+
+def _meta_path(data_path):
+    return data_path.with_suffix(".json")
+
+
+def _reader_options(families, prefix, burnin, burnin_frac, thin):
+    return {
+        "families": None if families is None else list(families),
+        "prefix": prefix,
+        "burnin": int(burnin),
+        "burnin_frac": burnin_frac,
+        "thin": int(thin),
+    }
+
+
+def source_digest(file_path, cache_dir):
+    """
+    SHA-256 of a source log, re-hashed only when its size or mtime has
+    changed since the last lookup (stamped in `cache_dir`). Cache entries
+    derived from the log, here and in violin_cache, record this digest so
+    that entries built from older contents can be pruned.
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    stamp_path = cache_dir / f"{file_path.name}.source.json"
+    if stamp_path.exists():
+        stamp = json.loads(stamp_path.read_text(encoding="utf-8"))
+        if stamp["size"] == stat.st_size and stamp["mtime_ns"] == stat.st_mtime_ns:
+            return stamp["sha256"]
+
+    digest = file_digest(file_path)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stamp_path.write_text(json.dumps({
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+    }), encoding="utf-8")
+    return digest
+
+
+def _prune_stale(cache_dir, source_name, digest):
+    """
+    Remove cached entries of `source_name` built from other file contents.
+    """
+    for meta_path in cache_dir.glob(f"{source_name}.*.json"):
+        if meta_path.name.endswith(".source.json"):
+            continue
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if meta.get("sha256") != digest:
+            meta_path.with_suffix(".npy").unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+
+
+def cached_read_log(file_path, families=GLM_FAMILIES, prefix="country",
+                    burnin=0, burnin_frac=None, thin=1, cache_dir=None):
+    """
+    `read_log` backed by the columnar cache. The first call parses the text
+    log and stores the result; later calls with the same file contents and
+    options memory-map the stored matrix instead.
+
+    cache_dir defaults to a `.beast_cache` folder next to the log.
+    """
+    file_path = Path(file_path)
+    cache_dir = Path(cache_dir) if cache_dir else file_path.parent / CACHE_DIR_NAME
+
+    options = _reader_options(families, prefix, burnin, burnin_frac, thin)
+    digest = source_digest(file_path, cache_dir)
+    key = hashlib.sha256(
+        (digest + json.dumps(options, sort_keys=True)).encode("utf-8")
+    ).hexdigest()[:16]
+    data_path = cache_dir / f"{file_path.name}.{key}.npy"
+
+    if data_path.exists() and _meta_path(data_path).exists():
+        return load_columnar(data_path)
+
+    df = read_log(file_path, families=families, prefix=prefix, burnin=burnin,
+                  burnin_frac=burnin_frac, thin=thin)
+    _prune_stale(cache_dir, file_path.name, digest)
+    save_columnar(df, data_path, source=file_path.name, sha256=digest,
+                  options=options)
+    return load_columnar(data_path)
+
+
+def load_log(file_path, cache=True, **options):
+    """
+    Load posterior samples from either a BEAST .log file or a columnar .npy
+    file (e.g. merged chains from combine_chains.py). Reader options only
+    apply to .log input; a .npy file is returned as stored.
+    """
+    if Path(file_path).suffix == ".npy":
+        return load_columnar(file_path)
+    if cache:
+        return cached_read_log(file_path, **options)
+    return read_log(file_path, **options)
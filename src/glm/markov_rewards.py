@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Markov jump counts and rewards of discrete traits, as logged by BEAST.
+
+The markovJumpsTreeLikelihood of a trait declares one register per ordered
+pair of states (a K x K matrix with a single 1, e.g. continent.AsiaToEurope)
+plus a total (continent.count), and a <rewards> block with one K-vector per
+state. BEAST samples the jumps and the time spent in each state by
+stochastic mapping along every branch and writes each register to the main
+.log (fileLog) at every logged state. These are the values of Fig. 3.
+
+The registers are read from the XML and matched to their log columns, which
+BEAST names after the register id, optionally with a "c_" (counts) or "r_"
+(rewards) prefix; "u_" unconditioned columns are not used. Register ids may
+abbreviate the states (NA, SA), so the pair / state of every register is
+taken from the position of its 1 in the matrix, in data type order. Only the
+register columns are read, in chunks.
+
+Output per trait: posterior mean and 95% HPD of the jumps of every ordered
+pair (From, To, MJ, low, high) and of the time spent in every state (State,
+reward, low, high), as the sheets <trait>_jumps and <trait>_rewards.
+
+Usage: python markov_rewards.py LOG --xml XML OUT.xlsx [--trait continent [--trait host]]
+           [--burnin-frac 0.1]
+"""
+
+import argparse
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from beast_log import iter_log_chunks, read_log_header
+from bssvs import trait_states
+from hpd import summarise_samples
+
+DEFAULT_TRAITS = ("continent",)
+DEFAULT_CRED_MASS = 0.95
+
+LIKELIHOOD = r'<markovJumpsTreeLikelihood id="{trait}\.treeLikelihood"[^>]*>(.*?)</markovJumpsTreeLikelihood>'
+REGISTER = re.compile(r'<parameter id="([^"]+)"\s+value="([^"]*)"\s*/>', re.DOTALL)
+REWARDS = re.compile(r'<rewards>(.*?)</rewards>', re.DOTALL)
+
+COLUMN_PREFIXES = ("", "c_", "r_")
+
+
+class Registers:
+    """
+    Jump and reward registers of one trait: {register id: (from, to)} and
+    {register id: state}, with the state names of the data type.
+    """
+
+    def __init__(self, trait, jumps, rewards):
+        self.trait = trait
+        self.jumps = jumps
+        self.rewards = rewards
+
+
+def _single_entry(value, size):
+    """
+    Position of the only non-zero entry of a register value, or None when
+    the register sums over several entries (e.g. the total count).
+    """
+    entries = np.array(value.split(), dtype=np.float64)
+    if len(entries) != size:
+        raise ValueError(f"register of {len(entries)} values, expected {size}")
+    nonzero = np.flatnonzero(entries)
+    return int(nonzero[0]) if len(nonzero) == 1 else None
+
+
+def registers_from_xml(xml_path, trait="continent"):
+    """
+    `Registers` of the markovJumpsTreeLikelihood of `trait` in a BEAST XML.
+    """
+    text = Path(xml_path).read_text(encoding="utf-8")
+    states = trait_states(text, trait)
+    block = re.search(LIKELIHOOD.format(trait=re.escape(trait)), text, re.DOTALL)
+    if states is None or block is None:
+        raise ValueError(f"No Markov jumps likelihood for trait '{trait}' in {xml_path}")
+    n = len(states)
+    body = block.group(1)
+    rewards_block = REWARDS.search(body)
+    reward_body = rewards_block.group(1) if rewards_block else ""
+    if rewards_block:
+        body = body[:rewards_block.start()] + body[rewards_block.end():]
+
+    jumps = {}
+    for register, value in REGISTER.findall(body):
+        entry = _single_entry(value, n * n)
+        if entry is not None:
+            jumps[register] = (states[entry // n], states[entry % n])
+    rewards = {}
+    for register, value in REGISTER.findall(reward_body):
+        entry = _single_entry(value, n)
+        if entry is not None:
+            rewards[register] = states[entry]
+    return Registers(trait, jumps, rewards)
+
+
+def register_columns(columns, registers):
+    """
+    {register id: log column} of every register, matched with the prefixes
+    BEAST may give the column.
+    """
+    present = set(columns)
+    matched, missing = {}, []
+    for register in registers:
+        column = next((p + register for p in COLUMN_PREFIXES if p + register in present),
+                      None)
+        if column is None:
+            missing.append(register)
+        else:
+            matched[register] = column
+    if missing:
+        raise ValueError(f"Registers not logged: {', '.join(missing)}")
+    return matched
+
+
+def logged_samples(log_path, columns, burnin=0, burnin_frac=None):
+    """
+    (samples x columns) matrix of the given log columns after burn-in.
+    """
+    blocks = [chunk.iloc[:, 1:].to_numpy(dtype=np.float64)
+              for chunk in iter_log_chunks(log_path, burnin=burnin,
+                                           burnin_frac=burnin_frac, columns=columns)]
+    if not blocks:
+        raise ValueError(f"No samples left in {log_path} after burn-in")
+    return np.concatenate(blocks)
+
+
+def _summary(samples, cred_mass):
+    summary = summarise_samples(samples, cred_masses=(cred_mass,))
+    low, high = summary["hpd"][cred_mass]
+    return summary["mean"], low, high
+
+
+def markov_rewards(log_path, xml_path, traits=DEFAULT_TRAITS, burnin=0, burnin_frac=None,
+                   cred_mass=DEFAULT_CRED_MASS):
+    """
+    {sheet name: table} of the logged jumps and rewards of every trait, all
+    read in one pass over the log.
+    """
+    header = read_log_header(log_path)
+    registers = [registers_from_xml(xml_path, trait) for trait in traits]
+    columns = [register_columns(header, {**r.jumps, **r.rewards}) for r in registers]
+    wanted = list(dict.fromkeys(c for cols in columns for c in cols.values()))
+    samples = logged_samples(log_path, wanted, burnin, burnin_frac)
+    position = {c: i for i, c in enumerate(wanted)}
+
+    tables = {}
+    for reg, cols in zip(registers, columns):
+        mean, low, high = _summary(samples[:, [position[cols[r]] for r in reg.jumps]],
+                                   cred_mass)
+        pairs = list(reg.jumps.values())
+        tables[f"{reg.trait}_jumps"] = pd.DataFrame({
+            "From": [a for a, _ in pairs], "To": [b for _, b in pairs],
+            "MJ": mean, "low": low, "high": high})
+        mean, low, high = _summary(samples[:, [position[cols[r]] for r in reg.rewards]],
+                                   cred_mass)
+        tables[f"{reg.trait}_rewards"] = pd.DataFrame({
+            "State": list(reg.rewards.values()), "reward": mean, "low": low, "high": high})
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="main BEAST .log (fileLog) of the run")
+    parser.add_argument("--xml", required=True, help="BEAST XML that wrote the log")
+    parser.add_argument("output", help="output .xlsx workbook")
+    parser.add_argument("--trait", action="append", default=None,
+                        help="discrete trait (repeatable, default continent)")
+    parser.add_argument("--burnin", type=int, default=0)
+    parser.add_argument("--burnin-frac", type=float, default=None)
+    args = parser.parse_args()
+
+    tables = markov_rewards(args.log, args.xml, args.trait or DEFAULT_TRAITS,
+                            args.burnin, args.burnin_frac)
+    with pd.ExcelWriter(args.output) as writer:
+        for sheet, table in tables.items():
+            table.to_excel(writer, sheet_name=sheet, index=False)
+    print(f"Workbook written to: {args.output}")
+    for sheet, table in tables.items():
+        print(f"\n{sheet}")
+        print(table.to_string(index=False, float_format='{:,.3f}'.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Array-native point layer for the GLM violin + scatter figures.
+
+All plotted points of all coefficients are held in contiguous NumPy arrays
+(value, group, x position, size); coefficient k owns the slice
+offsets[k]:offsets[k + 1], so per-coefficient access needs no masking.
+Finished figures are written to any number of outputs by `save_figure`.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from downsample import downsample
+
+
+def assemble_points(activated_coeffs, max_points=1500, size_range=(2, 5),
+                    jitter=0.15, seed=42, method="quantile"):
+    """
+    Downsample each coefficient's samples to at most `max_points` (see
+    downsample.py for the strategies) and build the point arrays in one pass.
+    Jitter and sizes come from a seeded generator, so figures are
+    reproducible.
+
+    Returns a dict with 'value', 'group', 'x', 'size' (length N),
+    'offsets' (length K + 1) and 'labels' (length K).
+    """
+    sampled = [downsample(c['Values'], max_points, method, seed) for c in activated_coeffs]
+    counts = np.array([len(v) for v in sampled], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    value = np.concatenate(sampled) if sampled else np.empty(0)
+
+    group = np.repeat(np.arange(len(activated_coeffs)), counts)
+    rng = np.random.default_rng(seed)
+    x = group + jitter * (rng.random(value.size) - 0.5)
+    size = rng.uniform(size_range[0], size_range[1], value.size)
+
+    return {
+        'value': value,
+        'group': group,
+        'x': x,
+        'size': size,
+        'offsets': offsets,
+        'labels': [c['Coefficient'] for c in activated_coeffs],
+    }
+
+
+def rank_in_group(points):
+    """
+    Position of every point within its coefficient, scaled to [0, 1].
+    """
+    offsets = points['offsets']
+    counts = np.diff(offsets)[points['group']]
+    rank = np.arange(points['value'].size) - offsets[points['group']]
+    return rank / np.maximum(counts - 1, 1)
+
+
+def save_figure(fig, output_files, dpi=600, **kwargs):
+    """
+    Save one rendered figure to several outputs without rebuilding it.
+    `output_files` is a path or a list of paths; an entry may also be a
+    (path, dpi) pair to override the resolution of that output.
+    Returns the list of written paths.
+    """
+    if isinstance(output_files, (str, Path)):
+        output_files = [output_files]
+    written = []
+    for entry in output_files:
+        path, entry_dpi = entry if isinstance(entry, tuple) else (entry, dpi)
+        fig.savefig(path, dpi=entry_dpi, **kwargs)
+        written.append(str(path))
+    return written
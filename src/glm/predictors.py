@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Registry of the country-pair GLM predictors.
+
+Every predictor CSV is parsed once into a dense float64 tensor
+(predictor x origin x destination) in the 22-country order of the XML, with
+the country labels of every file checked against that order. The
+log-transformed, standardised version (as written into the BEAST design
+matrix) is stored next to the raw values in `.beast_cache` and memory-mapped
+on later loads; the cache key covers the contents of every source file.
+
+    registry = load_registry(".", xml_path="H7glm_noGDP.xml")
+    registry.value("distance", "China", "Japan")
+    design = registry.design_matrix(["distance", "migration"])
+
+Run as a script to check that the registry rebuilds the design matrix of
+GLM XMLs (every column present in the XML, values matching the stored ones):
+
+Usage: python predictors.py XML [XML ...] [--data-dir .] [--tol 1e-9]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from log_cache import CACHE_DIR_NAME, CACHE_VERSION, file_digest
+
+# Discrete states of the country GLM, in the order of the XML <generalDataType>
+COUNTRIES = (
+    "Bangladesh", "Belgium", "Cambodia", "Canada", "Chile", "China", "Egypt",
+    "Germany", "HongKong", "Italy", "Japan", "Korea", "Mexico", "Mongolia",
+    "Netherlands", "Pakistan", "SouthAfrica", "Sweden", "Taiwan", "Thailand",
+    "UK", "USA",
+)
+
+# Predictors in the coefficient order of the GLM logs: (XML parameter id,
+# source, kind, log-transform). kind is 'origin'/'destination' for
+# per-country CSVs, 'pair' for country x country matrices and 'xml' for
+# predictors that are only stored (already standardised) in the BEAST XML.
+GLM_PREDICTORS = (
+    ("air_origin", "airpassager.csv", "origin", True),
+    ("air_destination", "airpassager.csv", "destination", True),
+    ("chickenstock_origin", "chickenstockcsv.csv", "origin", True),
+    ("chickenstock_destination", "chickenstockcsv.csv", "destination", True),
+    ("distance", "distance.csv", "pair", True),
+    ("GDP_origin", "GDPper.csv", "origin", True),
+    ("GDP_destination", "GDPper.csv", "destination", True),
+    ("jiangshui_origin", "rainfall.csv", "origin", True),
+    ("jiangshui_destination", "rainfall.csv", "destination", True),
+    ("migration", "migration.csv", "pair", False),
+    ("tradenetweight", "tradenetweight.csv", "pair", True),
+    ("temp_origin", "temp.csv", "origin", True),
+    ("temp_destination", "temp.csv", "destination", True),
+    ("samples_origin", None, "xml", False),
+    ("samples_destination", None, "xml", False),
+)
+
+# Storage type of the predictor tensors (part of the cache key)
+TENSOR_DTYPE = "float64"
+
+
+def route_pairs(n_states=len(COUNTRIES)):
+    """
+    Origin and destination indices of every off-diagonal route in BEAST order:
+    the upper triangle row by row (origin < dest), then the same pairs reversed.
+    """
+    upper_o, upper_d = np.triu_indices(n_states, k=1)
+    return np.concatenate([upper_o, upper_d]), np.concatenate([upper_d, upper_o])
+
+
+def route_labels(countries=COUNTRIES):
+    origin, destination = route_pairs(len(countries))
+    return [f"{countries[o]}->{countries[d]}" for o, d in zip(origin, destination)]
+
+
+def standardise(values):
+    """
+    Centre and scale to unit sample standard deviation (ddof=1), as BEAUti
+    does for GLM predictors.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return (values - values.mean()) / values.std(ddof=1)
+
+
+def _check_labels(path, labels, countries, axis="row"):
+    labels = list(labels)
+    duplicated = sorted({c for c in labels if labels.count(c) > 1})
+    missing = sorted(set(countries) - set(labels))
+    unexpected = sorted(set(labels) - set(countries))
+    if duplicated or missing or unexpected:
+        raise ValueError(f"{path}: {axis} labels do not match the country list "
+                         f"(missing {missing}, unexpected {unexpected}, "
+                         f"duplicated {duplicated})")
+
+
+def read_country_csv(path, countries=COUNTRIES):
+    """
+    Per-country CSV (country,value) as a vector in `countries` order.
+    """
+    series = pd.read_csv(path, index_col=0).iloc[:, 0]
+    _check_labels(path, series.index, countries)
+    return series.reindex(countries).to_numpy(dtype=np.float64)
+
+
+def read_pair_csv(path, countries=COUNTRIES):
+    """
+    Country x country CSV as a matrix with rows and columns in `countries` order.
+    """
+    frame = pd.read_csv(path, index_col=0)
+    _check_labels(path, frame.index, countries, "row")
+    _check_labels(path, frame.columns, countries, "column")
+    return frame.loc[list(countries), list(countries)].to_numpy(dtype=np.float64)
+
+
+def xml_design_columns(xml_path, prefix="country"):
+    """
+    Standardised design-matrix columns stored in a GLM XML, by parameter id.
+    """
+    text = Path(xml_path).read_text(encoding="utf-8")
+    start = text.index(f'<designMatrix id="{prefix}.designMatrix">')
+    block = text[start:text.index("</designMatrix>", start)]
+    return {
+        name: np.array(values.split(), dtype=np.float64)
+        for name, values in re.findall(
+            rf'<parameter id="{re.escape(prefix)}\.([^"]+)" value="([^"]+)"', block)
+    }
+
+
+class PredictorRegistry:
+    """
+    All GLM predictors as (predictor x origin x destination) float64 tensors.
+
+    raw          : values as read (XML-only predictors hold their stored values)
+    standardised : log-transformed where flagged, then standardised over the
+                   off-diagonal routes; the values BEAST sees
+    Diagonals are NaN. Predictors of kind 'xml' are included only when
+    `xml_path` is given and its design matrix has them (an XML with the
+    sample-size predictors dropped has neither).
+    """
+
+    def __init__(self, predictors=GLM_PREDICTORS, data_dir=".", xml_path=None,
+                 countries=COUNTRIES, cache=True, cache_dir=None):
+        self.data_dir = Path(data_dir)
+        self.xml_path = xml_path
+        self.countries = tuple(countries)
+        self.specs = {spec[0]: spec for spec in predictors}
+        self.xml_columns = xml_design_columns(xml_path) if xml_path is not None else {}
+        self.names = tuple(spec[0] for spec in predictors
+                           if spec[2] != "xml" or spec[0] in self.xml_columns)
+        self.country_index = {c: i for i, c in enumerate(self.countries)}
+        self.predictor_index = {n: i for i, n in enumerate(self.names)}
+
+        if cache:
+            cache_dir = Path(cache_dir) if cache_dir else self.data_dir / CACHE_DIR_NAME
+            tensors = self._cached_tensors(cache_dir)
+        else:
+            tensors = self._build_tensors()
+        self.raw, self.standardised = tensors[0], tensors[1]
+
+    def _sources(self):
+        sources = sorted({self.data_dir / self.specs[n][1] for n in self.names
+                          if self.specs[n][2] != "xml"})
+        if self.xml_path is not None:
+            sources.append(Path(self.xml_path))
+        return sources
+
+    def _build_tensors(self):
+        """
+        Parse every source once into a (2 x P x n x n) float64 array holding
+        the raw and the standardised tensors.
+        """
+        n = len(self.countries)
+        origin, destination = route_pairs(n)
+        out = np.full((2, len(self.names), n, n), np.nan, dtype=TENSOR_DTYPE)
+        parsed = {}
+
+        for p, name in enumerate(self.names):
+            _, source, kind, log = self.specs[name]
+            if kind == "xml":
+                raw = standardised = self.xml_columns[name]
+            else:
+                if source not in parsed:
+                    reader = read_pair_csv if kind == "pair" else read_country_csv
+                    parsed[source] = reader(self.data_dir / source, self.countries)
+                values = parsed[source]
+                if kind == "pair":
+                    raw = values[origin, destination]
+                else:
+                    raw = values[origin if kind == "origin" else destination]
+                standardised = standardise(np.log(raw)) if log else raw
+            out[0, p, origin, destination] = raw
+            out[1, p, origin, destination] = standardised
+        return out
+
+    def _cached_tensors(self, cache_dir):
+        h = hashlib.sha256()
+        h.update(json.dumps([self.countries, [self.specs[n] for n in self.names],
+                             TENSOR_DTYPE, CACHE_VERSION]).encode("utf-8"))
+        for source in self._sources():
+            h.update(file_digest(source).encode("utf-8"))
+        data_path = cache_dir / f"predictors.{h.hexdigest()[:16]}.npy"
+
+        if not data_path.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = data_path.with_name(data_path.name + ".tmp")
+            with open(tmp, "wb") as fh:
+                np.save(fh, self._build_tensors())
+            os.replace(tmp, data_path)
+        return np.load(data_path, mmap_mode="r")
+
+    def index_of(self, country):
+        try:
+            return self.country_index[country]
+        except KeyError:
+            raise KeyError(f"unknown country {country!r}") from None
+
+    def matrix(self, name, standardised=True):
+        """
+        (origin x destination) matrix of one predictor.
+        """
+        if name not in self.predictor_index:
+            self._missing(name)
+        tensor = self.standardised if standardised else self.raw
+        return tensor[self.predictor_index[name]]
+
+    def value(self, name, origin, destination, standardised=True):
+        """
+        Predictor value of one route, looked up by country names.
+        """
+        tensor = self.standardised if standardised else self.raw
+        if name not in self.predictor_index:
+            self._missing(name)
+        return float(tensor[self.predictor_index[name],
+                            self.index_of(origin), self.index_of(destination)])
+
+    def design_matrix(self, names=None):
+        """
+        (routes x predictors) float64 design matrix in BEAST route order.
+        """
+        names = self.names if names is None else list(names)
+        for name in names:
+            if name not in self.predictor_index:
+                self._missing(name)
+        origin, destination = route_pairs(len(self.countries))
+        indices = [self.predictor_index[n] for n in names]
+        return np.asarray(self.standardised[indices][:, origin, destination].T,
+                          dtype=np.float64)
+
+    def _missing(self, name):
+        if name in self.specs and self.specs[name][2] == "xml":
+            if self.xml_path is not None:
+                raise ValueError(f"{self.xml_path}: no design-matrix column {name}")
+            raise ValueError(f"{name} is only stored in the BEAST XML; "
+                             f"pass the GLM XML (--xml)")
+        raise KeyError(f"unknown predictor {name!r}")
+
+
+@lru_cache(maxsize=None)
+def load_registry(data_dir=".", xml_path=None):
+    """
+    Registry of the default GLM predictors, built once per process.
+    """
+    return PredictorRegistry(GLM_PREDICTORS, data_dir, xml_path)
+
+
+def check_design(xml_path, data_dir=".", prefix="country"):
+    """
+    Largest absolute difference between every design-matrix column stored in
+    `xml_path` and the registry's rebuilt column, by predictor.
+    """
+    stored = xml_design_columns(xml_path, prefix)
+    registry = load_registry(str(data_dir), str(xml_path))
+    design = registry.design_matrix(list(stored))
+    return pd.DataFrame({
+        "Predictor": list(stored),
+        "Source": [registry.specs[n][1] or "xml" for n in stored],
+        "Max Abs Diff": [np.max(np.abs(design[:, j] - values))
+                         for j, values in enumerate(stored.values())],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("xml", nargs="+", help="GLM XMLs to rebuild the design matrix of")
+    parser.add_argument("--data-dir", default=".", help="folder of the predictor CSVs")
+    parser.add_argument("--tol", type=float, default=1e-9,
+                        help="largest accepted absolute difference")
+    args = parser.parse_args()
+
+    failed = []
+    for xml_path in args.xml:
+        table = check_design(xml_path, args.data_dir)
+        print(f"\n{xml_path}: {len(table)} design-matrix columns")
+        print(table.to_string(index=False, float_format="{:.3g}".format))
+        if (table["Max Abs Diff"] > args.tol).any():
+            failed.append(xml_path)
+    if failed:
+        raise SystemExit(f"Design matrix differs from the XML by more than {args.tol:g}: "
+                         f"{', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Posterior reconstruction of the GLM country transition log-rates.
+
+BEAST's logLinear GLM sets log r(o -> d) = sum_p beta_p * delta_p * x_p(o, d),
+where x_p are the standardised predictors of the design matrix. The design
+matrix comes from the predictor registry (predictors.py: the CSVs
+log-transformed and standardised with ddof=1, exactly as in the XML), and
+the log-rates of all 462 routes are computed for every posterior state with one einsum per chunk
+of coefficientsTimesIndicators. Chunks are streamed to a column-major .npy
+file (see log_cache.ColumnarWriter), so memory stays bounded by the chunk size
+and the per-route summary reads each route's samples contiguously.
+
+Routes are in BEAST order (see predictors.route_pairs).
+
+Usage: python rate_matrix.py LOG (--xml GLM.xml | --predictors NAME ...) [--burnin-frac 0.1]
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from beast_log import family_indices, iter_log_chunks, read_log_header, DEFAULT_CHUNKSIZE
+from hpd import summarise_samples
+from log_cache import ColumnarWriter
+from predictors import (COUNTRIES, load_registry, route_labels, route_pairs,
+                        xml_design_columns)
+
+# |beta * x| shares are formed per (state, route, predictor); this many
+# states are expanded at a time
+SHARE_BLOCK = 1000
+
+# Routes summarised at a time from the memory-mapped log-rates
+SUMMARY_BLOCK = 32
+
+
+def predictors_for_log(log_path, xml_path=None, names=None, prefix="country"):
+    """
+    Predictor names of a GLM log, in coefficient order: `names` when given,
+    otherwise the design-matrix columns of the XML that produced the log.
+    The coefficient count alone does not identify the set (e.g. 13 columns
+    is both "no sample size" and "no GDP"), so one of the two is required.
+    """
+    n_coeffs = len(family_indices(read_log_header(log_path), "coefficientsTimesIndicators", prefix))
+    if names is None:
+        if xml_path is None:
+            raise ValueError(f"{log_path}: {n_coeffs} coefficients; pass the GLM XML (--xml) "
+                             f"or the predictor names (--predictors) to identify them")
+        names = list(xml_design_columns(xml_path, prefix))
+    names = list(names)
+    if len(names) != n_coeffs:
+        raise ValueError(f"{log_path}: {n_coeffs} coefficients, "
+                         f"{len(names)} predictors given ({', '.join(names)})")
+    return names
+
+
+def log_rates(coefficients, design):
+    """
+    Log-rates of every route for every state: (states x P) . (routes x P)^T.
+    """
+    return np.einsum("sp,rp->sr", coefficients, design, optimize=True)
+
+
+def rate_matrices(route_values, n_states=len(COUNTRIES)):
+    """
+    Unpack (states x routes) values into (states x origin x destination)
+    matrices with a NaN diagonal.
+    """
+    route_values = np.atleast_2d(route_values)
+    out = np.full((route_values.shape[0], n_states, n_states), np.nan)
+    origin, destination = route_pairs(n_states)
+    out[:, origin, destination] = route_values
+    return out
+
+
+def contribution_share_sums(coefficients, design, block=SHARE_BLOCK):
+    """
+    Sum over states of each predictor's share |beta_p x_p| / sum_q |beta_q x_q|
+    of every route's log-rate. Returns (routes x P); states where no predictor
+    is included contribute nothing.
+    """
+    abs_design = np.abs(design)
+    totals = np.zeros(design.shape)
+    for start in range(0, len(coefficients), block):
+        parts = np.abs(coefficients[start:start + block])[:, None, :] * abs_design[None]
+        norm = parts.sum(axis=2, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            totals += np.nan_to_num(parts / norm).sum(axis=0)
+    return totals
+
+
+def write_log_rates(log_path, outfile, design, prefix="country", burnin=0,
+                    burnin_frac=None, thin=1, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Stream the posterior log-rates of `log_path` into `outfile` (.npy with a
+    'state' column and one column per route). Returns the summed contribution
+    shares (routes x P) and the number of states written.
+    """
+    family = "coefficientsTimesIndicators"
+    share_sums = np.zeros(design.shape)
+    columns = ["state"] + route_labels()
+
+    with ColumnarWriter(outfile, columns, source=Path(log_path).name) as writer:
+        for chunk in iter_log_chunks(log_path, families=(family,), prefix=prefix,
+                                     burnin=burnin, burnin_frac=burnin_frac,
+                                     thin=thin, chunksize=chunksize):
+            coefficients = chunk.iloc[:, 1:].to_numpy()
+            if coefficients.shape[1] != design.shape[1]:
+                raise ValueError(f"{log_path}: {coefficients.shape[1]} coefficients, "
+                                 f"design matrix has {design.shape[1]} predictors")
+            rates = log_rates(coefficients, design)
+            writer.write(np.column_stack([chunk["state"].to_numpy(), rates]))
+            share_sums += contribution_share_sums(coefficients, design)
+        n_written = writer.n_rows
+    return share_sums, n_written
+
+
+def route_summary(route_values, share_means, predictor_names, countries=COUNTRIES,
+                  cred_mass=0.95):
+    """
+    Per-route posterior summary of the log-rates with the mean contribution
+    share of every predictor. `route_values` (states x routes) may be a
+    memory map; it is summarised `SUMMARY_BLOCK` routes at a time, which are
+    contiguous in the column-major file `write_log_rates` produces.
+    """
+    blocks = []
+    for start in range(0, route_values.shape[1], SUMMARY_BLOCK):
+        block = np.asarray(route_values[:, start:start + SUMMARY_BLOCK], dtype=np.float64)
+        stats = summarise_samples(block, cred_masses=(cred_mass,))
+        blocks.append(pd.DataFrame({
+            'Mean': stats['mean'],
+            'Median': stats['median'],
+            'Std': stats['std'],
+            'HPD Lower': stats['hpd'][cred_mass][0],
+            'HPD Upper': stats['hpd'][cred_mass][1],
+        }))
+    origin, destination = route_pairs(len(countries))
+    table = pd.concat(blocks, ignore_index=True)
+    table.insert(0, 'Origin', [countries[o] for o in origin])
+    table.insert(1, 'Destination', [countries[d] for d in destination])
+    table['Rate Median'] = np.exp(table['Median'])
+    shares = pd.DataFrame(share_means, columns=[f'Share {n}' for n in predictor_names])
+    return pd.concat([table, shares], axis=1)
+
+
+def reconstruct_rates(log_path, xml_path=None, data_dir=".", outfile=None,
+                      burnin=0, burnin_frac=None, thin=1, chunksize=DEFAULT_CHUNKSIZE,
+                      predictors=None):
+    """
+    Full pipeline for one GLM log: write `<log>_lograte.npy` and
+    `<log>_routes.tsv`, and return the route summary table. The predictors
+    are those of the XML, or the explicit `predictors` names.
+    """
+    predictors = predictors_for_log(log_path, xml_path, predictors)
+    design = load_registry(data_dir, xml_path).design_matrix(predictors)
+    stem = Path(log_path).with_suffix('')
+    outfile = outfile or f"{stem}_lograte.npy"
+
+    share_sums, n_states = write_log_rates(log_path, outfile, design, burnin=burnin,
+                                           burnin_frac=burnin_frac, thin=thin,
+                                           chunksize=chunksize)
+    routes = np.load(outfile, mmap_mode="r")[:, 1:]
+    table = route_summary(routes, share_sums / max(n_states, 1), predictors)
+
+    summary_path = f"{stem}_routes.tsv"
+    Path(summary_path).write_text(table.to_csv(sep='\t', index=False), encoding='utf-8')
+    print(f"Log-rates of {n_states:,} states x {design.shape[0]} routes written to: {outfile}")
+    print(f"Route summary written to: {summary_path}")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="GLM .log file")
+    parser.add_argument("--xml", help="GLM XML that produced the log (predictor set and "
+                                      "sample-size predictors)")
+    parser.add_argument("--predictors", nargs="+", default=None,
+                        help="predictor names in coefficient order, instead of --xml")
+    parser.add_argument("--data-dir", default=".", help="folder with the predictor CSVs")
+    parser.add_argument("--burnin", type=int, default=0)
+    parser.add_argument("--burnin-frac", type=float, default=None)
+    parser.add_argument("--thin", type=int, default=1)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    table = reconstruct_rates(args.log, args.xml, args.data_dir, burnin=args.burnin,
+                              burnin_frac=args.burnin_frac, thin=args.thin,
+                              chunksize=args.chunksize, predictors=args.predictors)
+    shares = table.filter(like='Share ').mean().sort_values(ascending=False)
+    print("\nMean contribution share over routes:")
+    print(shares.to_string(float_format='{:.3f}'.format))
+
+
+if __name__ == "__main__":
+    main()
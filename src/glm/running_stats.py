@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Running statistics for GLM logs that are read incrementally.
+
+Counts, activation rates and moments are exact; quantiles and HPD intervals
+come from a fixed-size reservoir sample per coefficient, so memory stays
+bounded however long the chain runs.
+"""
+
+import numpy as np
+
+from beast_log import family_indices
+from hpd import DEFAULT_CRED_MASSES, summarise_samples
+
+
+class RunningMoments:
+    """
+    Per-column count, mean and variance, merged batch by batch
+    (Chan et al. parallel update). Entries outside `mask` are ignored.
+    """
+
+    def __init__(self, n_params):
+        self.n = np.zeros(n_params, dtype=np.int64)
+        self.mean = np.zeros(n_params)
+        self.m2 = np.zeros(n_params)
+
+    def update(self, values, mask):
+        nb = mask.sum(axis=0)
+        if not nb.any():
+            return
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(nb > 0, np.where(mask, values, 0).sum(axis=0) / nb, 0)
+            m2_b = np.where(mask, (values - mean_b) ** 2, 0).sum(axis=0)
+            total = self.n + nb
+            delta = mean_b - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * nb / total, 0)
+            self.m2 = self.m2 + m2_b + np.where(
+                total > 0, delta ** 2 * self.n * nb / total, 0)
+        self.n = total
+
+    @property
+    def std(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > 0, np.sqrt(self.m2 / self.n), np.nan)
+
+
+class ReservoirSketch:
+    """
+    Uniform reservoir sample of fixed capacity per column (Algorithm R,
+    vectorised over each incoming batch). Used as a bounded-memory quantile
+    sketch.
+    """
+
+    def __init__(self, n_params, capacity=20_000, seed=42):
+        self.capacity = capacity
+        self.seen = np.zeros(n_params, dtype=np.int64)
+        self.reservoir = np.full((capacity, n_params), np.nan)
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values, mask):
+        for j in range(values.shape[1]):
+            new = values[mask[:, j], j]
+            if new.size:
+                self._add(j, new)
+
+    def _add(self, j, new):
+        seen = self.seen[j]
+        # Fill empty slots first
+        n_fill = min(max(self.capacity - seen, 0), new.size)
+        self.reservoir[seen:seen + n_fill, j] = new[:n_fill]
+        rest = new[n_fill:]
+        if rest.size:
+            # Item t (0-based) replaces slot r ~ U{0..t} when r < capacity;
+            # later items overwrite earlier ones, as in the sequential algorithm
+            t = seen + n_fill + np.arange(rest.size)
+            slot = (self.rng.random(rest.size) * (t + 1)).astype(np.int64)
+            keep = slot < self.capacity
+            self.reservoir[slot[keep], j] = rest[keep]
+        self.seen[j] += new.size
+
+    def filled(self):
+        """
+        Boolean mask of occupied reservoir slots, shape (capacity, n_params).
+        """
+        return np.arange(self.capacity)[:, None] < np.minimum(self.seen, self.capacity)
+
+
+class GlmRunningSummary:
+    """
+    Incrementally updated counterpart of `summarise_glm_coefficients`.
+    Feed it log chunks with `update`; `activated_coeffs` returns the same
+    per-coefficient dict layout, so `export_hpd_table` can write it directly.
+    """
+
+    def __init__(self, names=None, prefix="country", capacity=20_000, seed=42):
+        self.names = names
+        self.prefix = prefix
+        self.capacity = capacity
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.indices = None
+        self.n_states = 0
+
+    def update(self, chunk):
+        if chunk.empty:
+            return
+        if self.indices is None:
+            self.indices = family_indices(chunk.columns, "coefficients", self.prefix)
+            self.moments = RunningMoments(len(self.indices))
+            self.sketch = ReservoirSketch(len(self.indices), self.capacity, self.seed)
+
+        coeffs = chunk[[f"{self.prefix}.coefficients{i}" for i in self.indices]].to_numpy()
+        active = chunk[[f"{self.prefix}.coefIndicators{i}" for i in self.indices]].to_numpy() == 1.0
+        self.n_states += len(chunk)
+        self.moments.update(coeffs, active)
+        self.sketch.update(coeffs, active)
+
+    def activated_coeffs(self, cred_masses=DEFAULT_CRED_MASSES):
+        if self.indices is None:
+            return []
+        masses = tuple(sorted(set(cred_masses) | {0.95}))
+        filled = self.sketch.filled()
+        stats = summarise_samples(self.sketch.reservoir, filled, masses)
+        n_active = self.moments.n
+        std = self.moments.std
+
+        activated_coeffs = []
+        for j, i in enumerate(self.indices):
+            entry = {
+                'Coefficient': self.names[i] if self.names else f'β{i}',
+                'Values': self.sketch.reservoir[filled[:, j], j],
+                'Activation Rate': n_active[j] / self.n_states,
+                'Mean': self.moments.mean[j] if n_active[j] else np.nan,
+                'Median': stats['median'][j],
+                'Std': std[j],
+                '95% CI Lower': stats['q025'][j],
+                '95% CI Upper': stats['q975'][j],
+                'HPD Lower': stats['hpd'][0.95][0][j],
+                'HPD Upper': stats['hpd'][0.95][1][j],
+                'Sample Size': int(n_active[j])
+            }
+            for m in masses:
+                if m != 0.95:
+                    entry[f'HPD {m:.0%} Lower'] = stats['hpd'][m][0][j]
+                    entry[f'HPD {m:.0%} Upper'] = stats['hpd'][m][1][j]
+            activated_coeffs.append(entry)
+        return activated_coeffs
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Trace plots of every column of a BEAST log.
+
+Each trace is reduced with Largest-Triangle-Three-Buckets (LTTB) before it is
+drawn, so a 100k-state chain keeps its visual shape (spikes, plateaus,
+indicator switches) in a few thousand points and the SVG stays small. LTTB is
+run for all columns at once: the loop is over buckets only, and each bucket's
+triangle areas are one (bucket length x columns) array operation. Every panel
+is a single LineCollection holding the trace and, optionally, its running
+mean computed from the full chain.
+
+Outputs: `<log>_trace.png/.svg`.
+
+Usage: python trace_plot.py LOG [LOG ...] [--all-columns] [--points 2000]
+           [--running-mean] [--burnin STATE | --burnin-frac F]
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+from beast_log import GLM_FAMILIES
+from log_cache import load_log
+from plot_data import save_figure
+
+DEFAULT_TRACE_POINTS = 2000
+
+
+def lttb_indices(y, n_out=DEFAULT_TRACE_POINTS, x=None):
+    """
+    LTTB downsampling of one trace (n,) or of several traces sharing x (n, C).
+    Returns the kept row indices, shape (n_out,) or (n_out, C); the first and
+    last rows are always kept. With n <= n_out every row is returned.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    single = y.ndim == 1
+    if single:
+        y = y[:, None]
+    n, n_cols = y.shape
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    if n <= n_out or n_out < 3:
+        keep = np.repeat(np.arange(n)[:, None], n_cols, axis=1)
+        return keep[:, 0] if single else keep
+
+    # Bucket b covers rows edges[b]:edges[b + 1]; first and last rows are their own buckets
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    keep = np.empty((n_out, n_cols), dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    cols = np.arange(n_cols)
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Third vertex: mean of the next bucket (the last row for the final bucket)
+        nxt = slice(hi, edges[b + 2]) if b + 2 < n_out - 1 else slice(n - 1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean(axis=0)
+        a = keep[b]
+        ax_, ay = x[a], y[a, cols]
+        area = np.abs((ax_ - cx) * (y[lo:hi] - ay)
+                      - (ax_[None, :] - x[lo:hi, None]) * (cy - ay))
+        keep[b + 1] = lo + np.argmax(area, axis=0)
+    return keep[:, 0] if single else keep
+
+
+def running_mean(y):
+    """
+    Cumulative mean along the chain for (n,) or (n, C) samples.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    counts = np.arange(1, len(y) + 1).reshape((-1,) + (1,) * (y.ndim - 1))
+    return np.cumsum(y, axis=0) / counts
+
+
+def trace_segments(states, values, n_out=DEFAULT_TRACE_POINTS, with_mean=False):
+    """
+    Downsampled (points x 2) trace of every column of `values` (n, C), and
+    the running mean sampled at the same states when `with_mean` is set.
+    Returns a list with one list of segments per column.
+    """
+    states = np.asarray(states, dtype=np.float64)
+    keep = lttb_indices(values, n_out, x=states)
+    means = running_mean(values) if with_mean else None
+    segments = []
+    for j in range(values.shape[1]):
+        rows = keep[:, j]
+        panel = [np.column_stack([states[rows], values[rows, j]])]
+        if with_mean:
+            panel.append(np.column_stack([states[rows], means[rows, j]]))
+        segments.append(panel)
+    return segments
+
+
+def create_trace_grid(df, output_files, columns=None, n_out=DEFAULT_TRACE_POINTS,
+                      with_mean=False, ncols=5, prefix="country", dpi=300):
+    """
+    Grid of trace plots, one panel (and one LineCollection) per column.
+    Returns the written paths.
+    """
+    columns = [c for c in df.columns if c != "state"] if columns is None else list(columns)
+    values = df[columns].to_numpy(dtype=np.float64)
+    segments = trace_segments(df["state"].to_numpy(), values, n_out, with_mean)
+
+    nrows = -(-len(columns) // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(3.2 * ncols, 1.9 * nrows),
+                             sharex=True, squeeze=False)
+    colors = ['#1F77B4', '#D62728']
+    for ax, column, panel in zip(axes.flat, columns, segments):
+        ax.add_collection(LineCollection(panel, colors=colors[:len(panel)],
+                                         linewidths=[0.4, 1.2][:len(panel)]))
+        ax.autoscale_view()
+        ax.set_title(column.removeprefix(f"{prefix}."), fontsize=8)
+        ax.tick_params(labelsize=6)
+        ax.ticklabel_format(axis='x', style='sci', scilimits=(0, 0))
+        ax.xaxis.get_offset_text().set_fontsize(6)
+    for ax in axes.flat[len(columns):]:
+        ax.set_visible(False)
+    for ax in axes[-1]:
+        ax.set_xlabel('State', fontsize=7)
+
+    fig.tight_layout()
+    written = save_figure(fig, output_files, dpi=dpi)
+    plt.close(fig)
+    return written
+
+
+def trace_plot(file_path, all_columns=False, n_out=DEFAULT_TRACE_POINTS,
+               with_mean=False, burnin=0, burnin_frac=None, ncols=5, prefix="country"):
+    """
+    Trace grid of one log: the GLM columns (coefficients, indicators and
+    their products), or every column with `all_columns` (e.g. rate logs).
+    """
+    families = None if all_columns else GLM_FAMILIES
+    df = load_log(file_path, families=families, prefix=prefix,
+                  burnin=burnin, burnin_frac=burnin_frac)
+    stem = Path(file_path).with_suffix('')
+    written = create_trace_grid(df, [f"{stem}_trace.png", f"{stem}_trace.svg"],
+                                n_out=n_out, with_mean=with_mean, ncols=ncols,
+                                prefix=prefix)
+    for path in written:
+        print(f"Figure saved to: {path} ({len(df.columns) - 1} traces, "
+              f"{min(len(df), n_out)} of {len(df)} states drawn)")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="BEAST .log files (or merged .npy)")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="plot every column instead of the GLM families")
+    parser.add_argument("--points", type=int, default=DEFAULT_TRACE_POINTS,
+                        help=f"points kept per trace (default {DEFAULT_TRACE_POINTS})")
+    parser.add_argument("--running-mean", action="store_true",
+                        help="overlay the running mean of each trace")
+    parser.add_argument("--ncols", type=int, default=5)
+    parser.add_argument("--burnin", type=int, default=0,
+                        help="discard states <= BURNIN (default 0)")
+    parser.add_argument("--burnin-frac", type=float, default=None,
+                        help="discard this fraction of each chain instead")
+    args = parser.parse_args()
+
+    for log in args.logs:
+        trace_plot(log, all_columns=args.all_columns, n_out=args.points,
+                   with_mean=args.running_mean, burnin=args.burnin,
+                   burnin_frac=args.burnin_frac, ncols=args.ncols)
+
+
+if __name__ == "__main__":
+    main()
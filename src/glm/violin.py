@@ -10,6 +10,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import arviz as az
 
+from downsample import downsample_indices
+from log_cache import load_log
+from violin_cache import draw_violins, violin_shapes
+
 # Set professional plotting parameters
 plt.rcParams.update({
     "font.family": "sans-serif",
@@ -31,6 +35,8 @@ plt.rcParams.update({
 LOG_PATH = pathlib.Path("H7glm.country.glm.log")
 BURN_IN_FRAC = 0.10
 OUTFILE = "GLM_coefficients_violin.pdf"
+STRIP_POINTS = 1500          # sample points drawn per predictor
+STRIP_METHOD = "quantile"    # see downsample.py
 
 # Predictor names mapping
 PREDICTOR_NAMES = {
@@ -54,10 +60,10 @@ PREDICTOR_NAMES = {
 def main():
     print("Processing BEAST log file...")
     
-    # Read and clean data
-    df = pd.read_csv(LOG_PATH, sep=r"\s+", comment="#")
-    burn_in_n = int(len(df) * BURN_IN_FRAC)
-    df_posterior = df.iloc[burn_in_n:].reset_index(drop=True)
+    # Stream only the coefficient columns, dropping burn-in while reading;
+    # the parsed columns are reused from .beast_cache on later runs
+    df_posterior = load_log(LOG_PATH, families=("coefficientsTimesIndicators",),
+                            burnin_frac=BURN_IN_FRAC)
     
     # Extract coefficients
     coef_cols = [c for c in df_posterior.columns 
@@ -85,18 +91,18 @@ def main():
     # Create figure
     fig, ax = plt.subplots(figsize=(10, 5))
     
-    # Create violin plot
-    sns.violinplot(
-        data=long_df,
-        x="predictor_name",
-        y="coefficient",
-        order=predictor_order,
-        palette="viridis",
-        cut=0,
+    # Create violin plot from the KDE curves of every sample, reused from
+    # .beast_cache when the log and settings are unchanged
+    shapes = violin_shapes([long_df.loc[long_df["predictor_name"] == name, "coefficient"].to_numpy()
+                            for name in predictor_order], bw_method="scott", source=LOG_PATH)
+    draw_violins(
+        ax,
+        shapes,
+        labels=predictor_order,
+        colors=[sns.desaturate(c, 0.8)
+                for c in sns.color_palette("viridis", n_colors=len(predictor_order))],
         inner="box",
-        linewidth=0.8,
-        saturation=0.8,
-        ax=ax
+        linewidth=0.8
     )
     
     # Add horizontal line at zero
@@ -113,9 +119,15 @@ def main():
     # Add grid for readability
     ax.grid(True, axis="y", linestyle="--", alpha=0.3)
     
-    # Add data points to show density
+    # Add data points to show density (a bounded, distribution-preserving
+    # subset per predictor; the violins above use every sample)
+    strip_df = pd.concat([
+        group.iloc[downsample_indices(group["coefficient"].to_numpy(),
+                                      STRIP_POINTS, STRIP_METHOD)]
+        for _, group in long_df.groupby("predictor_name", sort=False)
+    ])
     sns.stripplot(
-        data=long_df,
+        data=strip_df,
         x="predictor_name",
         y="coefficient",
         order=predictor_order,
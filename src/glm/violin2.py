@@ -10,9 +10,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib import ticker
-import random
 from pathlib import Path
 
+from log_cache import load_log
+from hpd import summarise_glm_coefficients
+from plot_data import assemble_points, rank_in_group, save_figure
+from violin_cache import draw_violins, violin_shapes
+
 # ----------------------------------------------
 # plotting parameters (unchanged)
 plt.rcParams.update({
@@ -44,72 +48,13 @@ plt.rcParams.update({
 # ----------------------------------------------
 
 
-def compute_hpd(samples: np.ndarray, cred_mass: float = 0.95):
-    """
-    计算给定样本的一维 HPD 区间 (Highest Posterior Density)。
-    若样本量为 0，返回 (nan, nan)。
-    """
-    n = len(samples)
-    if n == 0:
-        return np.nan, np.nan
-
-    sorted_samples = np.sort(samples)
-    interval_idx_inc = int(np.floor(cred_mass * n))
-    if interval_idx_inc < 1:
-        return np.percentile(samples, [(1 - cred_mass) / 2 * 100,
-                                       (1 + cred_mass) / 2 * 100])
-
-    interval_width = sorted_samples[interval_idx_inc:] - sorted_samples[: n - interval_idx_inc]
-    min_idx = np.argmin(interval_width)
-    hpd_min = sorted_samples[min_idx]
-    hpd_max = sorted_samples[min_idx + interval_idx_inc]
-    return hpd_min, hpd_max
-
-
-def process_glm_data(file_path):
+def process_glm_data(file_path, burnin=0, burnin_frac=None, thin=1, cache=True):
     """
     处理 GLM 日志文件，提取系数和指示变量数据，
     并计算均值/中位数/CI/HPD 等统计量。
     """
-    df = pd.read_csv(file_path, sep='\t', comment='#', low_memory=False)
-
-    df = df[df['state'] != 0]
-
-    activated_coeffs = []
-
-    for i in range(1, 16):
-        coeff_col = f'country.coefficients{i}'
-        indicator_col = f'country.coefIndicators{i}'
-
-        activated_mask = df[indicator_col] == 1.0
-        activated_values = df.loc[activated_mask, coeff_col].to_numpy()
-        n_activated = len(activated_values)
-
-        if n_activated > 0:
-            mean_val = activated_values.mean()
-            median_val = np.median(activated_values)
-            std_val = activated_values.std()
-            ci_lower, ci_upper = np.percentile(activated_values, [2.5, 97.5])
-            hpd_lower, hpd_upper = compute_hpd(activated_values, 0.95)
-        else:
-            mean_val = median_val = std_val = np.nan
-            ci_lower = ci_upper = hpd_lower = hpd_upper = np.nan
-
-        activated_coeffs.append({
-            'Coefficient': f'β{i}',
-            'Values': activated_values,
-            'Activation Rate': n_activated / len(df),
-            'Mean': mean_val,
-            'Median': median_val,
-            'Std': std_val,
-            '95% CI Lower': ci_lower,
-            '95% CI Upper': ci_upper,
-            'HPD Lower': hpd_lower,
-            'HPD Upper': hpd_upper,
-            'Sample Size': n_activated
-        })
-
-    return activated_coeffs
+    df = load_log(file_path, cache=cache, burnin=burnin, burnin_frac=burnin_frac, thin=thin)
+    return summarise_glm_coefficients(df)
 
 
 def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv"):
@@ -127,7 +72,12 @@ def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv"):
             '95% CI Lower': c['95% CI Lower'],
             '95% CI Upper': c['95% CI Upper'],
             'HPD Lower': c['HPD Lower'],
-            'HPD Upper': c['HPD Upper']
+            'HPD Upper': c['HPD Upper'],
+            # narrower credible masses from the same batched pass
+            'HPD 80% Lower': c.get('HPD 80% Lower', np.nan),
+            'HPD 80% Upper': c.get('HPD 80% Upper', np.nan),
+            'HPD 50% Lower': c.get('HPD 50% Lower', np.nan),
+            'HPD 50% Upper': c.get('HPD 50% Upper', np.nan)
         }
         for c in activated_coeffs
     ])
@@ -138,64 +88,42 @@ def export_hpd_table(activated_coeffs, outfile="GLM_Coefficient_HPD.tsv"):
     print(f"\nHPD table written to: {outfile}\n")
 
 
-def create_combined_plot(activated_coeffs, output_file):
+def create_combined_plot(activated_coeffs, output_files, max_points=1000, dpi=600,
+                         sample_method='quantile', source=None):
     """
     创建小提琴图 + 散点图组合。
     （代码主体与原来一致，只是读取了新字段，不影响绘图。）
+    max_points: 每个系数绘制的散点数。
+    sample_method: 抽样方式（'quantile', 'reservoir', 'random', 'even'）。
+    output_files: 单个路径或路径列表（可为 (path, dpi)），图只绘制一次。
+    source: 系数所来自的日志文件（决定小提琴缓存的位置）。
     """
     fig, ax = plt.subplots(figsize=(16, 10))
 
-    plot_data = []
-    for coeff in activated_coeffs:
-        n = len(coeff['Values'])
-        if n == 0:
-            continue
-        sample_size = min(1000, n)
-        indices = np.linspace(0, n - 1, sample_size, dtype=int)
-        sampled_values = coeff['Values'][indices]
-        for v in sampled_values:
-            plot_data.append({
-                'Coefficient': coeff['Coefficient'],
-                'Value': v,
-                'Size': random.uniform(3, 8)
-            })
-
-    plot_df = pd.DataFrame(plot_data)
+    points = assemble_points(activated_coeffs, max_points=max_points,
+                             size_range=(3, 8), jitter=0.15, seed=42,
+                             method=sample_method)
 
     palette = sns.color_palette("viridis", n_colors=len(activated_coeffs))
-    sns.violinplot(
-        x='Coefficient',
-        y='Value',
-        data=plot_df,
-        palette=palette,
-        inner=None,
-        cut=0,
-        bw_method=0.25,
-        linewidth=1.5,
-        saturation=0.85,
-        ax=ax
+    # KDE curves of the full posterior samples, reused from .beast_cache
+    shapes = violin_shapes([c['Values'] for c in activated_coeffs], bw_method=0.25, cut=0,
+                           source=source)
+    draw_violins(ax, shapes, labels=points['labels'],
+                 colors=[sns.desaturate(c, 0.85) for c in palette], linewidth=1.5)
+
+    # Colour gradient 0.2 -> 0.8 along each coefficient's points
+    colors = plt.cm.viridis(0.2 + 0.6 * rank_in_group(points))
+    ax.scatter(
+        points['x'],
+        points['value'],
+        s=points['size'] * 10,
+        c=colors,
+        alpha=0.6,
+        edgecolors='black',
+        linewidths=0.3,
+        zorder=10
     )
 
-    np.random.seed(42)
-    jitter = 0.15
-    for i, coeff in enumerate(activated_coeffs):
-        if coeff['Sample Size'] == 0:
-            continue
-        coeff_df = plot_df[plot_df['Coefficient'] == coeff['Coefficient']]
-        x_pos = i + jitter * (np.random.rand(len(coeff_df)) - 0.5)
-        density_gradient = np.linspace(0.2, 0.8, len(coeff_df))
-        colors = [plt.cm.viridis(d) for d in density_gradient]
-        ax.scatter(
-            x_pos,
-            coeff_df['Value'],
-            s=coeff_df['Size'] * 10,
-            c=colors,
-            alpha=0.6,
-            edgecolors='black',
-            linewidths=0.3,
-            zorder=10
-        )
-
     for i, coeff in enumerate(activated_coeffs):
         if coeff['Sample Size'] == 0:
             continue
@@ -247,7 +175,7 @@ def create_combined_plot(activated_coeffs, output_file):
         f"• Total Activated Samples: {total_points:,}\n"
         f"• Median Activation Rate: {median_activation:.1%}\n"
         f"• Significant Coefficients: {significant_coeffs}/15\n"
-        f"• Visualization: {len(plot_df):,} points shown (sampled)"
+        f"• Visualization: {points['value'].size:,} points shown (sampled)"
     )
     ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
             ha='left', va='top', fontsize=11,
@@ -260,10 +188,10 @@ def create_combined_plot(activated_coeffs, output_file):
             fontsize=10, bbox=dict(facecolor='white',
                                    alpha=0.7, edgecolor='none'))
 
-    plt.savefig(output_file, dpi=600)
-    plt.close()
-    print(f"Figure saved to: {output_file}")
-    print(f"Total points visualised: {len(plot_df):,} (sampled)")
+    for path in save_figure(fig, output_files, dpi=dpi):
+        print(f"Figure saved to: {path}")
+    plt.close(fig)
+    print(f"Total points visualised: {points['value'].size:,} (sampled)")
 
 
 def main():
@@ -272,7 +200,7 @@ def main():
     output_hpd = "GLM_Coefficient_HPD.tsv"
 
     activated_coeffs = process_glm_data(input_file)
-    create_combined_plot(activated_coeffs, output_plot)
+    create_combined_plot(activated_coeffs, output_plot, source=input_file)
     export_hpd_table(activated_coeffs, output_hpd)
 
 
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cached violin shapes and a lightweight violin artist.
+
+`violin_shapes` fits one KDE curve (grid, density, bandwidth) per group of
+posterior samples with the binned FFT KDE and stores the curves, with the
+quartiles needed for an inner box, in the `.beast_cache` next to the log.
+The key is the hash of the samples themselves (so it follows the log
+contents and the burn-in / thinning used to read it) together with the KDE
+settings; restyling a figure reloads the curves instead of refitting them.
+
+`draw_violins` draws the curves as one PolyCollection, matching seaborn's
+violinplot with cut=0: every violin is scaled to the full width (what seaborn
+does when a palette is given without hue), or with density_norm='area' all
+violins share one density scale.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+from kde import binned_kde
+from log_cache import CACHE_DIR_NAME, CACHE_VERSION, source_digest
+
+VIOLIN_GRID_SIZE = 256
+SHAPE_FIELDS = ("grid", "density", "bandwidth", "n", "quartiles", "whiskers")
+
+
+def _shapes_key(samples, settings):
+    h = hashlib.sha256(json.dumps([settings, CACHE_VERSION], sort_keys=True).encode("utf-8"))
+    for values in samples:
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        h.update(str(values.size).encode("utf-8"))
+        h.update(values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def fit_violin_shapes(samples, bw_method=0.25, cut=0, grid_size=VIOLIN_GRID_SIZE):
+    """
+    KDE curve of every group. bw_method is the scipy/seaborn bandwidth factor
+    (bandwidth = bw_method * sample std), or 'scott' for n ** -0.2. Groups
+    without spread get an all-NaN curve and are drawn as a line at the median.
+    """
+    k = len(samples)
+    shapes = {
+        "grid": np.full((k, grid_size), np.nan),
+        "density": np.full((k, grid_size), np.nan),
+        "bandwidth": np.full(k, np.nan),
+        "n": np.zeros(k, dtype=np.int64),
+        "quartiles": np.full((k, 3), np.nan),
+        "whiskers": np.full((k, 2), np.nan),
+    }
+    for g, values in enumerate(samples):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        shapes["n"][g] = values.size
+        if values.size == 0:
+            continue
+        q1, q2, q3 = np.percentile(values, [25, 50, 75])
+        shapes["quartiles"][g] = q1, q2, q3
+        if values.size < 2 or values.std() == 0:
+            continue
+        factor = values.size ** -0.2 if bw_method == "scott" else bw_method
+        grid, density, bw = binned_kde(values, factor * values.std(ddof=1),
+                                       grid_size=grid_size, cut=cut)
+        fence = 1.5 * (q3 - q1)
+        shapes["grid"][g], shapes["density"][g], shapes["bandwidth"][g] = grid, density, bw
+        shapes["whiskers"][g] = (values[values >= q1 - fence].min(),
+                                 values[values <= q3 + fence].max())
+    return shapes
+
+
+def _prune_stale_shapes(cache_dir, source_name, digest):
+    """
+    Remove cached shapes of `source_name` fitted from other file contents.
+    """
+    for path in cache_dir.glob(f"violins.{source_name}.*.npz"):
+        try:
+            with np.load(path) as stored:
+                stale = str(stored["sha256"]) != digest
+        except (OSError, ValueError, KeyError):
+            continue
+        if stale:
+            path.unlink(missing_ok=True)
+
+
+def violin_shapes(samples, bw_method=0.25, cut=0, grid_size=VIOLIN_GRID_SIZE,
+                  cache=True, source=None, cache_dir=None):
+    """
+    `fit_violin_shapes` backed by a .npz file in `cache_dir`.
+
+    source is the log the samples were read from; cache_dir then defaults to
+    the `.beast_cache` folder next to it (as for the parsed logs) and shapes
+    fitted from earlier contents of that log are removed. Without a source
+    the cache is `.beast_cache` in the working directory.
+    """
+    settings = {"bw_method": bw_method, "cut": cut, "grid_size": grid_size}
+    if not cache:
+        return fit_violin_shapes(samples, **settings)
+
+    source = Path(source) if source is not None else None
+    if cache_dir:
+        cache_dir = Path(cache_dir)
+    else:
+        cache_dir = (source.parent if source is not None else Path()) / CACHE_DIR_NAME
+    key = _shapes_key(samples, settings)
+    name = f"violins.{source.name}.{key}.npz" if source is not None else f"violins.{key}.npz"
+    path = cache_dir / name
+    if path.exists():
+        with np.load(path) as stored:
+            return {f: stored[f] for f in SHAPE_FIELDS}
+
+    shapes = fit_violin_shapes(samples, **settings)
+    extra = {}
+    if source is not None:
+        digest = source_digest(source, cache_dir)
+        _prune_stale_shapes(cache_dir, source.name, digest)
+        extra["sha256"] = np.array(digest)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        np.savez(fh, **shapes, **extra)
+    tmp.replace(path)
+    return shapes
+
+
+def draw_violins(ax, shapes, positions=None, labels=None, width=0.8, colors=None,
+                 alpha=1.0, linewidth=1.0, edgecolor="0.25", zorder=1, inner=None,
+                 density_norm="width"):
+    """
+    Draw cached violin shapes on `ax` as a single PolyCollection.
+
+    inner=None or 'box' (interquartile box, 1.5 IQR whiskers and a median dot,
+    as in seaborn). density_norm='width' scales each violin to its own peak,
+    'area' scales all of them by the highest peak. With `labels`, the x axis is set up categorically like
+    seaborn does. Returns the PolyCollection.
+    """
+    grid, density = shapes["grid"], shapes["density"]
+    k = len(grid)
+    positions = np.arange(k) if positions is None else np.asarray(positions)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if density_norm == "area":
+            peak = np.nanmax(density) if np.isfinite(density).any() else 1.0
+        else:
+            peak = np.max(density, axis=1, keepdims=True)
+        half_width = density / peak * width / 2
+
+    verts, faces = [], []
+    for g in range(k):
+        if not np.isfinite(grid[g]).all():
+            continue
+        x = np.concatenate([positions[g] - half_width[g], (positions[g] + half_width[g])[::-1]])
+        y = np.concatenate([grid[g], grid[g][::-1]])
+        verts.append(np.column_stack([x, y]))
+        faces.append(colors[g] if colors is not None else "C0")
+
+    collection = PolyCollection(verts, facecolors=faces, edgecolors=edgecolor,
+                                linewidths=linewidth, alpha=alpha, zorder=zorder)
+    ax.add_collection(collection)
+
+    singular = ~np.isfinite(grid[:, 0]) & np.isfinite(shapes["quartiles"][:, 1])
+    if singular.any():
+        ax.hlines(shapes["quartiles"][singular, 1], positions[singular] - width / 2,
+                  positions[singular] + width / 2, color=edgecolor, linewidth=linewidth,
+                  zorder=zorder)
+
+    if inner == "box":
+        q = shapes["quartiles"]
+        w = shapes["whiskers"]
+        drawn = np.isfinite(w[:, 0])
+        ax.vlines(positions[drawn], w[drawn, 0], w[drawn, 1], color=edgecolor,
+                  linewidth=linewidth, zorder=zorder + 1)
+        ax.vlines(positions[drawn], q[drawn, 0], q[drawn, 2], color=edgecolor,
+                  linewidth=linewidth * 4, zorder=zorder + 1)
+        ax.scatter(positions[drawn], q[drawn, 1], s=(linewidth * 3) ** 2, color="white",
+                   zorder=zorder + 2)
+
+    if labels is not None:
+        ax.set_xticks(positions)
+        ax.set_xticklabels(labels)
+        ax.set_xlim(positions.min() - 0.5, positions.max() + 0.5)
+    ax.autoscale_view(scalex=labels is None)
+    return collection
@@ -5,14 +5,15 @@ Combined violin + scatter visualisation for GLM coefficients
 and extraction of 95 % HPD intervals.
 """
 
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib import ticker
-import random
-from pathlib import Path
-import matplotlib as mpl
+
+from log_cache import load_log
+from hpd import summarise_glm_coefficients
+from kde import point_density
+from plot_data import assemble_points, save_figure
+from violin_cache import draw_violins, violin_shapes
 
 # ----------------------------------------------
 # plotting parameters
@@ -45,48 +46,15 @@ plt.rcParams.update({
 # ----------------------------------------------
 
 
-def compute_hpd(samples: np.ndarray, cred_mass: float = 0.95):
-    """
-    Calculate the 1D HPD interval (Highest Posterior Density) for given samples.
-    Returns (nan, nan) if sample size is 0.
-    """
-    n = len(samples)
-    if n == 0:
-        return np.nan, np.nan
-
-    sorted_samples = np.sort(samples)
-    interval_idx_inc = int(np.floor(cred_mass * n))
-    # Fallback to regular quantiles if insufficient samples
-    if interval_idx_inc < 1:
-        return np.percentile(samples, [(1 - cred_mass) / 2 * 100,
-                                       (1 + cred_mass) / 2 * 100])
-
-    interval_width = sorted_samples[interval_idx_inc:] - sorted_samples[: n - interval_idx_inc]
-    min_idx = np.argmin(interval_width)
-    hpd_min = sorted_samples[min_idx]
-    hpd_max = sorted_samples[min_idx + interval_idx_inc]
-    return hpd_min, hpd_max
-
-
-def process_glm_data(file_path):
+def process_glm_data(file_path, burnin=0, burnin_frac=None, thin=1, cache=True):
     """
     Process GLM log file to extract coefficients and indicator variables,
     and calculate statistics like mean/median/CI/HPD.
     """
-    # Read data, skipping comment lines
-    df = pd.read_csv(file_path, sep='\t', comment='#', low_memory=False)
-
-    # Remove initial state rows (state=0)
-    df = df[df['state'] != 0]
-
-    max_coef = 0
-    for i in range(1, 16):
-        if f'country.coefficients{i}' in df.columns:
-            max_coef = i
-        else:
-            break
-
-    print(f"检测到 {max_coef} 个系数")
+    # Stream the log; burn-in (state 0 by default) and thinning are applied while reading.
+    # With cache=True the parsed columns are memory-mapped from .beast_cache after the first run;
+    # merged chains from combine_chains.py (.npy) are loaded as they are.
+    df = load_log(file_path, cache=cache, burnin=burnin, burnin_frac=burnin_frac, thin=thin)
 
     factor_names = {
         1: "Air passenger (o)",
@@ -106,48 +74,22 @@ def process_glm_data(file_path):
         15: "Sample size (d)"
     }
 
-    # Prepare results storage
-    activated_coeffs = []
-
-    for i in range(1, max_coef + 1):
-        coeff_col = f'country.coefficients{i}'
-        indicator_col = f'country.coefIndicators{i}'
-
-        # Activation mask
-        activated_mask = df[indicator_col] == 1.0
-        activated_values = df.loc[activated_mask, coeff_col].to_numpy()
-        n_activated = len(activated_values)
-
-        if n_activated > 0:
-            mean_val = activated_values.mean()
-            median_val = np.median(activated_values)
-            std_val = activated_values.std()
-            ci_lower, ci_upper = np.percentile(activated_values, [2.5, 97.5])
-            hpd_lower, hpd_upper = compute_hpd(activated_values, 0.95)
-        else:
-            mean_val = median_val = std_val = np.nan
-            ci_lower = ci_upper = hpd_lower = hpd_upper = np.nan
-
-        activated_coeffs.append({
-            'Coefficient': factor_names[i],
-            'Values': activated_values,
-            'Activation Rate': n_activated / len(df),
-            'Mean': mean_val,
-            'Median': median_val,
-            'Std': std_val,
-            '95% CI Lower': ci_lower,
-            '95% CI Upper': ci_upper,
-            'HPD Lower': hpd_lower,
-            'HPD Upper': hpd_upper,
-            'Sample Size': n_activated
-        })
+    activated_coeffs = summarise_glm_coefficients(df, names=factor_names)
+    print(f"检测到 {len(activated_coeffs)} 个系数")
 
     return activated_coeffs
 
 
-def create_combined_plot(activated_coeffs, output_file):
+def create_combined_plot(activated_coeffs, output_files, density_norm='global',
+                         max_points=1500, dpi=600, sample_method='quantile', source=None):
     """
     Create combined violin + scatter plot using HPD intervals and density-based coloring.
+    The figure is built once and saved to every entry of `output_files`
+    (a path, or a list of paths / (path, dpi) pairs).
+    source: the log the coefficients were read from (locates the violin cache).
+    density_norm: 'global' (one density over all coefficients) or 'group' (per coefficient).
+    max_points: number of scatter points drawn per coefficient.
+    sample_method: how they are picked ('quantile', 'reservoir', 'random', 'even').
     """
     n_coeffs = len(activated_coeffs)
     if n_coeffs == 13:
@@ -161,77 +103,35 @@ def create_combined_plot(activated_coeffs, output_file):
     ax = fig.add_subplot(gs[0])
     ax_bar = fig.add_subplot(gs[1])
 
-    np.random.seed(42)
-    jitter = 0.15
-    
     # Create a colormap for density (blue to purple)
-    cmap = plt.cm.get_cmap('plasma')
-    
-    plot_data = []
-    all_values = np.array([])
-    
-    for coeff in activated_coeffs:
-        n = len(coeff['Values'])
-        if n == 0:
-            continue
-        sample_size = min(1500, n)
-        indices = np.linspace(0, n - 1, sample_size, dtype=int)
-        sampled_values = coeff['Values'][indices]
-        all_values = np.concatenate((all_values, sampled_values))
-        
-        for v in sampled_values:
-            plot_data.append({
-                'Coefficient': coeff['Coefficient'],
-                'Value': v,
-                'Size': random.uniform(2, 5)
-            })
-
-    plot_df = pd.DataFrame(plot_data)
-    
-    # Calculate global density
-    if len(all_values) > 1:
-        from scipy.stats import gaussian_kde
-        kde = gaussian_kde(all_values)
-        plot_df['Density'] = kde(plot_df['Value'])
-        plot_df['Density'] = (plot_df['Density'] - plot_df['Density'].min()) / \
-                             (plot_df['Density'].max() - plot_df['Density'].min())
-    else:
-        plot_df['Density'] = 0.5
-    
-    for i, coeff in enumerate(activated_coeffs):
-        if coeff['Sample Size'] == 0:
-            continue
-        coeff_df = plot_df[plot_df['Coefficient'] == coeff['Coefficient']]
-        x_pos = i + jitter * (np.random.rand(len(coeff_df)) - 0.5)
-        
-        colors = cmap(coeff_df['Density'])
-        
-        ax.scatter(
-            x_pos,
-            coeff_df['Value'],
-            s=coeff_df['Size'] * 20,
-            c=colors,
-            alpha=0.5,
-            edgecolors='none',
-            zorder=5
-        )
+    cmap = plt.get_cmap('plasma')
+
+    # Contiguous arrays for all coefficients; seeded jitter and sizes
+    points = assemble_points(activated_coeffs, max_points=max_points,
+                             size_range=(2, 5), jitter=0.15, seed=42,
+                             method=sample_method)
+
+    # Density of every point from a binned FFT KDE, scaled to [0, 1]:
+    # 'global' pools all coefficients, 'group' normalises each coefficient separately
+    density = point_density(points['value'], points['group'], normalise=density_norm)
+
+    ax.scatter(
+        points['x'],
+        points['value'],
+        s=points['size'] * 20,
+        c=cmap(density),
+        alpha=0.5,
+        edgecolors='none',
+        zorder=5
+    )
 
     palette = sns.color_palette("crest", n_colors=len(activated_coeffs))
-    sns.violinplot(
-        x='Coefficient',
-        y='Value',
-        data=plot_df,
-        palette=palette,
-        inner=None,
-        cut=0,
-        bw_method=0.25,
-        linewidth=1.5,
-        saturation=0.85,
-        width=1.2,
-        alpha=0.7,
-        ax=ax,
-        zorder=10
-    )
+    # KDE curves of the full posterior samples, reused from .beast_cache
+    shapes = violin_shapes([c['Values'] for c in activated_coeffs], bw_method=0.25, cut=0,
+                           source=source)
+    draw_violins(ax, shapes, labels=points['labels'], width=1.2,
+                 colors=[sns.desaturate(c, 0.85) for c in palette],
+                 alpha=0.7, linewidth=1.5, zorder=10)
 
     for i, coeff in enumerate(activated_coeffs):
         if coeff['Sample Size'] == 0:
@@ -279,9 +179,9 @@ def create_combined_plot(activated_coeffs, output_file):
     
     plt.setp(ax_bar.get_xticklabels(), ha='right', rotation_mode='anchor')
 
-    plt.savefig(output_file, dpi=600, bbox_inches='tight')
-    plt.close()
-    print(f"Figure saved to: {output_file}")
+    for path in save_figure(fig, output_files, dpi=dpi, bbox_inches='tight'):
+        print(f"Figure saved to: {path}")
+    plt.close(fig)
 
 
 def main():
@@ -299,8 +199,8 @@ def main():
         print(f"\n处理文件: {input_file}")
         activated_coeffs = process_glm_data(input_file)
         
-        create_combined_plot(activated_coeffs, output_plot_png)
-        create_combined_plot(activated_coeffs, output_plot_svg)
+        create_combined_plot(activated_coeffs, [output_plot_png, output_plot_svg],
+                             source=input_file)
         
         print(f"完成处理: {input_file}")
         print(f"生成的文件:")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time-slice index over the branches of one tree: which lineages are alive at
+each of many times, and where.
+
+The index is built once per tree from the branch start / end years. Counting
+the lineages alive at k times is two binary searches per time into the
+sorted endpoints, O(k log n). Listing them places every branch's two
+endpoints in the sorted times instead, which gives the contiguous run of
+slices it is alive in, so the (slice, branch) pairs come out in
+O((n + k) log(n + k) + pairs) without scanning all branches for every slice.
+Positions of the live lineages are interpolated linearly along the branch, as
+in the wavefront computation.
+
+A branch is alive at t when start < t <= end.
+
+Usage: python branch_index.py STORE OUT.csv [--tree 0] [--slices 100]
+           [--times 2005 2010 ...]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from tree_extractions import load_extractions
+
+DEFAULT_SLICES = 100
+
+
+class Lineages:
+    """
+    Live lineages per time slice, grouped by slice: the lineages of slice j
+    are rows offsets[j]:offsets[j + 1] of `branch`, `fraction` (of the branch
+    elapsed), `lon` and `lat`.
+    """
+
+    def __init__(self, times, offsets, branch, fraction, lon=None, lat=None):
+        self.times = times
+        self.offsets = offsets
+        self.branch = branch
+        self.fraction = fraction
+        self.lon = lon
+        self.lat = lat
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @property
+    def slice(self):
+        """
+        Slice number of every row.
+        """
+        return np.repeat(np.arange(len(self)), self.counts)
+
+    def __getitem__(self, j):
+        return self.branch[self.offsets[j]:self.offsets[j + 1]]
+
+
+class BranchIndex:
+    """
+    Sorted branch endpoints of one tree, with the branch coordinates when
+    positions are wanted.
+    """
+
+    def __init__(self, start, end, start_lon=None, start_lat=None, end_lon=None,
+                 end_lat=None):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.sorted_start = np.sort(self.start)
+        self.sorted_end = np.sort(self.end)
+        self.start_lon, self.start_lat = start_lon, start_lat
+        self.end_lon, self.end_lat = end_lon, end_lat
+
+    @classmethod
+    def from_branches(cls, branches):
+        """
+        Index of a branch table given as named columns (`wavefront.tree_columns`
+        or a `TreeExtractions.tree` DataFrame).
+        """
+        return cls(*(np.asarray(branches[c], dtype=np.float64)
+                     for c in ("startYear", "endYear", "startLon", "startLat",
+                               "endLon", "endLat")))
+
+    def __len__(self):
+        return len(self.start)
+
+    def count(self, times):
+        """
+        Number of lineages alive at every time (lineages through time).
+        """
+        times = np.asarray(times, dtype=np.float64)
+        return (np.searchsorted(self.sorted_start, times, side="left")
+                - np.searchsorted(self.sorted_end, times, side="left"))
+
+    def pairs(self, times, pad=0.0):
+        """
+        CSR (offsets, branch) of the branches with start - pad < t <= end + pad
+        for every time t of `times`; with `pad` = w / 2 these are the branches
+        overlapping a window of width w centred on t.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        order = np.argsort(times, kind="stable")
+        ordered = times[order]
+        first = np.searchsorted(ordered, self.start - pad, side="right")
+        last = np.searchsorted(ordered, self.end + pad, side="right")
+        runs = np.maximum(last - first, 0)
+
+        total = int(runs.sum())
+        branch = np.repeat(np.arange(len(self)), runs)
+        run_start = np.repeat(np.cumsum(runs) - runs, runs)
+        rank = np.repeat(first, runs) + np.arange(total) - run_start
+        slices = order[rank]
+
+        by_slice = np.argsort(slices, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(slices, minlength=len(times)))])
+        return offsets, branch[by_slice]
+
+    def lineages(self, times):
+        """
+        `Lineages` alive at every time, with their interpolated positions when
+        the index has coordinates.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        offsets, branch = self.pairs(times)
+        t = np.repeat(times, np.diff(offsets))
+        start, end = self.start[branch], self.end[branch]
+        duration = end - start
+        fraction = np.divide(t - start, duration, out=np.ones_like(t), where=duration > 0)
+        lon = lat = None
+        if self.start_lon is not None:
+            lon = self.start_lon[branch] + fraction * (self.end_lon - self.start_lon)[branch]
+            lat = self.start_lat[branch] + fraction * (self.end_lat - self.start_lat)[branch]
+        return Lineages(times, offsets, branch, fraction, lon, lat)
+
+
+def lineage_positions(table, times):
+    """
+    Positions of the live lineages of one branch table (DataFrame with the
+    tree_extractions columns) at `times`, one row per lineage and slice.
+    """
+    lineages = BranchIndex.from_branches(table).lineages(times)
+    branch = lineages.branch
+    return pd.DataFrame({"time": times[lineages.slice],
+                         "node1": table["node1"].to_numpy(np.int64)[branch],
+                         "node2": table["node2"].to_numpy(np.int64)[branch],
+                         "lon": lineages.lon, "lat": lineages.lat})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("store", help="tree_extractions store")
+    parser.add_argument("output", help="CSV of the lineage positions")
+    parser.add_argument("--tree", type=int, default=0, help="sampled tree number (default 0)")
+    parser.add_argument("--slices", type=int, default=DEFAULT_SLICES,
+                        help=f"evenly spaced times over the tree (default {DEFAULT_SLICES})")
+    parser.add_argument("--times", type=float, nargs="+", default=None,
+                        help="explicit times (decimal years) instead of --slices")
+    args = parser.parse_args()
+
+    table = load_extractions(args.store).tree(args.tree)
+    times = (np.array(args.times) if args.times else
+             np.linspace(table["startYear"].min(), table["endYear"].max(), args.slices))
+    positions = lineage_positions(table, times)
+    positions.to_csv(args.output, index=False)
+    print(f"{len(positions)} lineage positions at {len(times)} times "
+          f"written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
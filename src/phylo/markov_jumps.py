@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Approximate Markov jump counts and rewards of discrete traits over a
+posterior tree set, from the node states of the trees.
+
+For every tree, every branch whose parent and child nodes carry different
+states of the trait (e.g. continent="Asia" -> continent="Europe") counts as
+one jump between that ordered pair, and the branch's duration goes to the
+time spent in each state (Markov rewards): all of it when both ends agree,
+half to each end state otherwise. The trees logged by these analyses keep
+the node states only (saveCompleteHistory="false"), so these are the
+node-to-node counts rather than BEAST's stochastically mapped ones: multiple
+changes along one branch count once, and the time of a change is not known.
+They can differ materially from the logged values (src/glm/markov_rewards.py),
+which are the ones Fig. 3 uses; the tables are therefore written as
+<trait>_node_jumps and <trait>_node_rewards.
+
+Each tree is one bincount over its branches per trait; trees are parsed in
+parallel and streamed, and the posterior mean and 95% HPD across trees are
+written per ordered pair (From, To, MJ, low, high) and per state (State,
+reward, low, high).
+
+Usage: python markov_jumps.py TREES OUT_PREFIX [--trait continent [--trait host]]
+           [--burnin N] [--samples N] [--random] [--excel OUT.xlsx] [--workers N]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from mcc_tree import parse_newick
+from tree_extractions import count_trees, map_sampled_trees, sample_indices
+from wavefront import DEFAULT_CRED_MASS, hpd_by_slice, write_tables
+
+DEFAULT_TRAITS = ("continent",)
+
+
+def tree_jumps(tree, trait="continent"):
+    """
+    (states, jumps, rewards) of one `mcc_tree.Tree`: the states present, the
+    (from x to) jump counts and the time spent in each state. Nodes without
+    a state are left out.
+    """
+    if trait not in tree:
+        raise KeyError(f"Trees have no '{trait}' annotation")
+    states, codes = np.unique(tree[trait], return_inverse=True)
+    if len(states) and states[0] == "":
+        states, codes = states[1:], codes - 1
+    n = len(states)
+
+    parent, child = codes[tree.parent[1:]], codes[1:]
+    length = tree.length[1:]
+    known = (parent >= 0) & (child >= 0)
+    change = known & (parent != child)
+
+    jumps = np.bincount(parent[change] * n + child[change], minlength=n * n).reshape(n, n)
+    rewards = (np.bincount(child[known], np.where(change, 0.5, 1.0)[known] * length[known],
+                           minlength=n)
+               + np.bincount(parent[change], 0.5 * length[change], minlength=n))
+    return states, jumps, rewards
+
+
+_worker = {}
+
+
+def _init_worker(translate, traits):
+    _worker.update(translate=translate, traits=traits)
+
+
+def _jumps_task(text):
+    tree = parse_newick(text, _worker["translate"])
+    return {trait: tree_jumps(tree, trait) for trait in _worker["traits"]}
+
+
+class JumpCounts:
+    """
+    Per-tree jumps (trees x states x states) and rewards (trees x states) of
+    one trait, over the states seen in any tree (sorted).
+    """
+
+    def __init__(self, per_tree):
+        self.states = sorted({s for states, _, _ in per_tree for s in states})
+        code = {s: i for i, s in enumerate(self.states)}
+        n = len(self.states)
+        self.jumps = np.zeros((len(per_tree), n, n))
+        self.rewards = np.zeros((len(per_tree), n))
+        for k, (states, jumps, rewards) in enumerate(per_tree):
+            idx = np.array([code[s] for s in states], dtype=np.int64)
+            self.jumps[k][np.ix_(idx, idx)] = jumps
+            self.rewards[k, idx] = rewards
+
+    def __len__(self):
+        return len(self.jumps)
+
+    def jump_table(self, cred_mass=DEFAULT_CRED_MASS):
+        """
+        Posterior mean and HPD of the jumps of every ordered pair of states.
+        """
+        n = len(self.states)
+        src, dst = np.nonzero(~np.eye(n, dtype=bool))
+        values = self.jumps[:, src, dst]
+        _, low, high = hpd_by_slice(values, cred_mass)
+        return pd.DataFrame({"From": np.array(self.states)[src],
+                             "To": np.array(self.states)[dst],
+                             "MJ": values.mean(axis=0), "low": low, "high": high})
+
+    def reward_table(self, cred_mass=DEFAULT_CRED_MASS):
+        """
+        Posterior mean and HPD of the time spent in every state, in the units
+        of the branch lengths (years).
+        """
+        _, low, high = hpd_by_slice(self.rewards, cred_mass)
+        return pd.DataFrame({"State": self.states, "reward": self.rewards.mean(axis=0),
+                             "low": low, "high": high})
+
+
+def markov_jumps(file_path, traits=DEFAULT_TRAITS, burnin=0, n_samples=None,
+                 random_sampling=False, workers=None, seed=42):
+    """
+    {trait: JumpCounts} over the sampled trees of `file_path`, every tree
+    parsed once for all `traits`.
+    """
+    n_trees = count_trees(file_path)
+    indices = sample_indices(n_trees, burnin, n_samples, random_sampling, seed)
+    if not len(indices):
+        raise ValueError(f"No trees to count in {file_path} "
+                         f"({n_trees} trees, burn-in {burnin})")
+    per_tree = {trait: [] for trait in traits}
+    for _, _, result in map_sampled_trees(file_path, indices, _jumps_task, _init_worker,
+                                          (tuple(traits),), workers):
+        for trait, counts in result.items():
+            per_tree[trait].append(counts)
+    return {trait: JumpCounts(counts) for trait, counts in per_tree.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trees", help="BEAST posterior (or MCC) .trees file")
+    parser.add_argument("out_prefix", help="prefix of the output tables")
+    parser.add_argument("--trait", action="append", default=None,
+                        help="discrete trait annotation (repeatable, default continent)")
+    parser.add_argument("--burnin", type=int, default=0, help="trees discarded first")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="number of trees used (default: all after burn-in)")
+    parser.add_argument("--random", action="store_true",
+                        help="sample trees at random instead of evenly spaced")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--excel", default=None, help="also write an .xlsx workbook")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = markov_jumps(args.trees, args.trait or DEFAULT_TRAITS, burnin=args.burnin,
+                          n_samples=args.samples, random_sampling=args.random,
+                          workers=args.workers, seed=args.seed)
+    tables = {}
+    for trait, trait_counts in counts.items():
+        tables[f"{trait}_node_jumps"] = trait_counts.jump_table()
+        tables[f"{trait}_node_rewards"] = trait_counts.reward_table()
+    print(f"{len(next(iter(counts.values())))} trees counted in "
+          f"{time.perf_counter() - start:.1f} s")
+    write_tables(tables, args.out_prefix, args.excel)
+
+
+if __name__ == "__main__":
+    main()
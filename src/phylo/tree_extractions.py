@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parallel branch extraction over a BEAST posterior tree file (Python
+counterpart of seraphim's treeExtractions).
+
+The .trees file is streamed one tree line at a time; the sampled trees are
+handed to a process pool (at most a few per worker in flight, so memory does
+not grow with the file), and every tree's branch table - the mcc_extractions
+columns plus the great-circle length of the branch - is appended in sample
+order to one columnar store:
+
+    <out>/branches.npy      float64 (all branches of all trees) x columns
+    <out>/tree_offsets.npy  branches of tree k are rows offsets[k]:offsets[k + 1]
+    <out>/extractions.json  column names, sampled tree names/indices, settings
+
+Branches can also be labelled with any number of groupings (--group), stored
+as extra `group.<name>` code columns with their categories in the sidecar:
+- `--group host`: the child node's `host` annotation (discrete-trait trees);
+- `--group host=H7meta.csv:label:host`: the tips' value in a metadata table;
+  an internal branch takes the value shared by all tips below it and is left
+  ungrouped (code -1) where they differ.
+
+`load_extractions` memory-maps the store. With --csv the seraphim-style
+TreeExtraction_<k>.csv files are written as well, for the R scripts.
+
+Usage: python tree_extractions.py TREES OUTDIR --mrsd 2024.494536
+           [--burnin N] [--samples 1000] [--random] [--workers N] [--csv]
+           [--group NAME | --group NAME=META.csv:TAXON_COL:VALUE_COL ...]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from itertools import chain
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mcc_extractions import MCC_COLUMNS, branch_columns
+from mcc_tree import TREE_LINE, iter_nexus_trees, parse_newick
+
+EXTRACTION_COLUMNS = MCC_COLUMNS + ["greatCircleDist_km"]
+
+# fields::rdist.earth radius, as used by seraphim
+EARTH_RADIUS_KM = 6378.388
+
+TASKS_PER_WORKER = 4
+
+# Store column holding the codes of a grouping
+GROUP_PREFIX = "group."
+
+
+def great_circle_km(lon1, lat1, lon2, lat2, radius=EARTH_RADIUS_KM):
+    """
+    Great-circle distance (haversine) between arrays of points in degrees.
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    h = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def count_trees(file_path):
+    """
+    Number of trees in a NEXUS file (one pass over the lines, nothing parsed).
+    """
+    with open(file_path, "r", encoding="utf-8") as fh:
+        return sum(1 for line in fh if TREE_LINE.match(line))
+
+
+def sample_indices(n_trees, burnin=0, n_samples=None, random_sampling=False, seed=42):
+    """
+    0-based indices of the trees to extract: after discarding `burnin` trees,
+    either all of them, `n_samples` evenly spaced (the last of every
+    interval, as seraphim does), or `n_samples` drawn at random.
+    """
+    available = np.arange(burnin, n_trees)
+    if n_samples is None or n_samples >= len(available):
+        return available
+    if random_sampling:
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(available, n_samples, replace=False))
+    interval = len(available) // n_samples
+    return available[interval - 1::interval][:n_samples]
+
+
+def branch_table(tree, most_recent_sampling_datum, attribute="location"):
+    """
+    Branch table of a `mcc_tree.Tree` as a float64 array (branches x columns).
+    """
+    columns = branch_columns(tree, most_recent_sampling_datum, attribute)
+    columns["greatCircleDist_km"] = great_circle_km(
+        columns["startLon"], columns["startLat"], columns["endLon"], columns["endLat"])
+    return np.column_stack([np.asarray(columns[c], dtype=np.float64)
+                            for c in EXTRACTION_COLUMNS])
+
+
+def extract_tree(text, translate, most_recent_sampling_datum, attribute="location"):
+    """
+    Branch table of one Newick string as a float64 array (branches x columns).
+    """
+    return branch_table(parse_newick(text, translate), most_recent_sampling_datum, attribute)
+
+
+def parse_group_spec(spec):
+    """
+    (name, source) of a --group argument: `NAME` groups by the node
+    annotation NAME; `NAME=TABLE:TAXON_COL:VALUE_COL` by a tip metadata
+    column, returned as a {taxon: value} dict.
+    """
+    name, sep, rest = spec.partition("=")
+    if not sep:
+        return name, name
+    path, taxon_col, value_col = rest.rsplit(":", 2)
+    sep = "\t" if path.endswith((".tsv", ".txt")) else ","
+    meta = pd.read_csv(path, sep=sep, usecols=[taxon_col, value_col], dtype=str).dropna()
+    return name, dict(zip(meta[taxon_col], meta[value_col]))
+
+
+def tip_groups(tree, groups):
+    """
+    Group of every node from the {taxon: group} of the tips: the group shared
+    by all tips below the node, '' where they differ or one is unknown.
+    """
+    categories = sorted(set(groups.values()))
+    code = {g: i for i, g in enumerate(categories)}
+    tips = tree.tips
+    tip_codes = np.array([code.get(groups.get(t), -1) for t in tree.label[tips]],
+                         dtype=np.int64)
+    low = np.full(len(tree), len(categories), dtype=np.int64)
+    high = np.full(len(tree), -1, dtype=np.int64)
+    low[tips] = tip_codes
+    high[tips] = tip_codes
+    # children come after their parent in pre-order: one reverse pass
+    parent = tree.parent
+    for i in range(len(tree) - 1, 0, -1):
+        p = parent[i]
+        low[p] = min(low[p], low[i])
+        high[p] = max(high[p], high[i])
+    labels = np.full(len(tree), "", dtype=object)
+    shared = (low == high) & (low >= 0)
+    labels[shared] = np.array(categories, dtype=object)[low[shared]]
+    return labels.astype(str)
+
+
+def branch_groups(tree, groups):
+    """
+    Label of every branch (child node in pre-order, as in `branch_table`) for
+    each grouping of `groups` ({name: annotation name or {taxon: group}}).
+    """
+    labels = {}
+    for name, source in groups.items():
+        if isinstance(source, dict):
+            node_labels = tip_groups(tree, source)
+        elif source in tree:
+            node_labels = np.asarray(tree[source]).astype(str)
+        else:
+            raise KeyError(f"Trees have no '{source}' annotation to group branches by")
+        labels[name] = node_labels[1:]
+    return labels
+
+
+_worker = {}
+
+
+def _init_worker(translate, most_recent_sampling_datum, attribute, groups):
+    _worker.update(translate=translate, mrsd=most_recent_sampling_datum, attribute=attribute,
+                   groups=groups)
+
+
+def _extract_task(text):
+    tree = parse_newick(text, _worker["translate"])
+    return (branch_table(tree, _worker["mrsd"], _worker["attribute"]),
+            branch_groups(tree, _worker["groups"]))
+
+
+def iter_sampled_trees(file_path, indices):
+    """
+    Yield (index, name, text, translate) for the trees at sorted `indices`,
+    stopping after the last one.
+    """
+    wanted = iter(indices)
+    target = next(wanted, None)
+    for k, (name, text, translate) in enumerate(iter_nexus_trees(file_path)):
+        if target is None:
+            return
+        if k == target:
+            yield k, name, text, translate
+            target = next(wanted, None)
+
+
+def map_sampled_trees(file_path, indices, task, initializer, initargs=(), workers=None):
+    """
+    Yield (index, name, task(text)) for the trees at sorted `indices`, in
+    that order, with `task` run over a process pool. Each worker is set up
+    with initializer(translate, *initargs); at most a few trees per worker
+    are in flight, so the file is streamed whatever its size.
+    """
+    workers = workers or os.cpu_count() or 1
+    trees = iter_sampled_trees(file_path, indices)
+    first = next(trees, None)
+    if first is None:
+        return
+    trees = chain([first], trees)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=(first[3],) + tuple(initargs)) as pool:
+        pending, done, order = {}, {}, []
+
+        def submit_next():
+            item = next(trees, None)
+            if item is None:
+                return False
+            k, name, text, _ = item
+            pending[pool.submit(task, text)] = k
+            order.append((k, name))
+            return True
+
+        while len(pending) < workers * TASKS_PER_WORKER and submit_next():
+            pass
+        emitted = 0
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[pending.pop(future)] = future.result()
+                submit_next()
+            # hand results back in sample order
+            while emitted < len(order) and order[emitted][0] in done:
+                k, name = order[emitted]
+                yield k, name, done.pop(k)
+                emitted += 1
+
+
+class ExtractionWriter:
+    """
+    Append per-tree branch tables to the columnar store in `out_dir`. Branch
+    labels of the `group_names` groupings are stored as codes into
+    categories numbered in order of appearance ('' -> -1).
+    """
+
+    def __init__(self, out_dir, group_names=(), **meta):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.meta = meta
+        self.categories = {name: {} for name in group_names}
+        self.columns = EXTRACTION_COLUMNS + [GROUP_PREFIX + name for name in group_names]
+        self.rows_path = self.out_dir / "branches.rows"
+        self._rows = open(self.rows_path, "wb")
+        self.offsets = [0]
+        self.names = []
+        self.indices = []
+
+    def encode(self, name, labels):
+        codes = self.categories[name]
+        values, inverse = np.unique(labels, return_inverse=True)
+        lookup = np.array([codes.setdefault(v, len(codes)) if v else -1 for v in values],
+                          dtype=np.float64)
+        return lookup[inverse]
+
+    def write(self, index, name, table, groups=None):
+        if self.categories:
+            table = np.column_stack([table] + [self.encode(g, groups[g])
+                                               for g in self.categories])
+        table = np.ascontiguousarray(table, dtype=np.float64)
+        self._rows.write(table.tobytes())
+        self.offsets.append(self.offsets[-1] + len(table))
+        self.names.append(name)
+        self.indices.append(int(index))
+
+    def close(self):
+        self._rows.close()
+        shape = (self.offsets[-1], len(self.columns))
+        tmp = self.out_dir / "branches.npy.tmp"
+        with open(tmp, "wb") as out, open(self.rows_path, "rb") as rows:
+            np.lib.format.write_array_header_1_0(
+                out, {"descr": "<f8", "fortran_order": False, "shape": shape})
+            shutil.copyfileobj(rows, out, 1 << 22)
+        os.replace(tmp, self.out_dir / "branches.npy")
+        self.rows_path.unlink()
+        np.save(self.out_dir / "tree_offsets.npy", np.array(self.offsets, dtype=np.int64))
+        sidecar = dict(self.meta, columns=self.columns, trees=self.names,
+                       tree_indices=self.indices,
+                       groups={name: list(codes) for name, codes in self.categories.items()})
+        (self.out_dir / "extractions.json").write_text(json.dumps(sidecar, indent=1),
+                                                      encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._rows.close()
+            self.rows_path.unlink(missing_ok=True)
+        return False
+
+
+class TreeExtractions:
+    """
+    Memory-mapped view of a store written by `tree_extractions`.
+    """
+
+    def __init__(self, out_dir):
+        out_dir = Path(out_dir)
+        self.meta = json.loads((out_dir / "extractions.json").read_text(encoding="utf-8"))
+        self.columns = self.meta["columns"]
+        self.groups = self.meta.get("groups", {})
+        self.branches = np.load(out_dir / "branches.npy", mmap_mode="r")
+        self.offsets = np.load(out_dir / "tree_offsets.npy")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def column(self, name):
+        """
+        One column over all branches of all trees.
+        """
+        return self.branches[:, self.columns.index(name)]
+
+    def group_codes(self, name):
+        """
+        Category codes of the grouping `name` over all branches (-1: ungrouped);
+        the categories are `self.groups[name]`.
+        """
+        return self.column(GROUP_PREFIX + name).astype(np.int64)
+
+    def tree_array(self, k):
+        return self.branches[self.offsets[k]:self.offsets[k + 1]]
+
+    def tree(self, k):
+        """
+        Branch table of the k-th sampled tree as a DataFrame.
+        """
+        return pd.DataFrame(np.asarray(self.tree_array(k)), columns=self.columns)
+
+    def tree_ids(self):
+        """
+        Sampled tree number of every branch (0..len - 1).
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+
+def load_extractions(out_dir):
+    return TreeExtractions(out_dir)
+
+
+def tree_extractions(file_path, out_dir, most_recent_sampling_datum, burnin=0,
+                     n_samples=None, random_sampling=False, attribute="location",
+                     workers=None, seed=42, groups=None):
+    """
+    Extract the branch tables of the sampled trees of `file_path` into
+    `out_dir` with a process pool. `groups` ({name: annotation name or
+    {taxon: group}}) adds branch group columns. Returns the opened
+    `TreeExtractions`.
+    """
+    groups = dict(groups or {})
+    n_trees = count_trees(file_path)
+    indices = sample_indices(n_trees, burnin, n_samples, random_sampling, seed)
+    if not len(indices):
+        raise ValueError(f"No trees to extract from {file_path} "
+                         f"({n_trees} trees, burn-in {burnin})")
+    meta = dict(source=Path(file_path).name, most_recent_sampling_datum=most_recent_sampling_datum,
+                attribute=attribute, burnin=burnin, n_trees=n_trees)
+
+    results = map_sampled_trees(file_path, indices, _extract_task, _init_worker,
+                                (most_recent_sampling_datum, attribute, groups), workers)
+    with ExtractionWriter(out_dir, group_names=list(groups), **meta) as writer:
+        for k, name, (table, labels) in results:
+            writer.write(k, name, table, labels)
+    return load_extractions(out_dir)
+
+
+def write_seraphim_csv(extractions, out_dir):
+    """
+    TreeExtraction_<k>.csv files (k = 1..n) as written by seraphim.
+    """
+    out_dir = Path(out_dir)
+    for k in range(len(extractions)):
+        table = extractions.tree(k)
+        for c in ("node1", "node2"):
+            table[c] = table[c].astype(np.int64)
+        for name, categories in extractions.groups.items():
+            codes = table.pop(GROUP_PREFIX + name).astype(np.int64)
+            table[name] = np.append(categories, "")[codes]
+        table.to_csv(out_dir / f"TreeExtraction_{k + 1}.csv", index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trees", help="BEAST posterior .trees file")
+    parser.add_argument("out_dir", help="folder for the columnar store")
+    parser.add_argument("--mrsd", type=float, required=True,
+                        help="most recent sampling date (decimal year)")
+    parser.add_argument("--burnin", type=int, default=0, help="trees discarded first")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="number of trees to extract (default: all after burn-in)")
+    parser.add_argument("--random", action="store_true",
+                        help="sample trees at random instead of evenly spaced")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--attribute", default="location",
+                        help="coordinate attribute name (default 'location')")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--group", action="append", default=[], metavar="SPEC",
+                        help="branch grouping: an annotation NAME or "
+                             "NAME=META.csv:TAXON_COL:VALUE_COL (repeatable)")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write seraphim-style TreeExtraction_<k>.csv files")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    extractions = tree_extractions(args.trees, args.out_dir, args.mrsd, burnin=args.burnin,
+                                   n_samples=args.samples, random_sampling=args.random,
+                                   attribute=args.attribute, workers=args.workers,
+                                   seed=args.seed,
+                                   groups=dict(map(parse_group_spec, args.group)))
+    if args.csv:
+        write_seraphim_csv(extractions, args.out_dir)
+    print(f"{len(extractions)} trees ({len(extractions.branches)} branches) extracted "
+          f"to {args.out_dir} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
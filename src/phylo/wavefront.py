@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Wavefront distance and weighted diffusion coefficient through time over a
+posterior tree set (the time-sliced statistics of seraphim's
+spreadStatistics, which fig7.py / logWFD.py plot).
+
+For every tree and every time slice t:
+- wavefront distance: the greatest great-circle distance from the root
+  location reached by t - branch end points reached before t and the
+  linearly interpolated positions of branches alive at t - kept
+  non-decreasing through time;
+- weighted diffusion coefficient: sum(d^2) / (4 sum(dt)) over the parts of
+  all branches inside a sliding window of `window` years centred on t, each
+  part taking its share of the branch's great-circle distance (km^2/year).
+
+Each tree gets one `BranchIndex`: the lineages alive at every slice and the
+branches overlapping every window come from its sorted endpoints rather than
+from a scan of all branches per slice. Trees are spread over a process pool,
+and the per-slice median and 95% HPD across trees are written as
+time/distance/low/high and time/diffusion_coefficient/low/high tables - the
+columns the figure scripts read.
+
+Strata (--stratify): the branch groupings of the store (e.g. host, wild)
+are all computed from the same per-tree index query - each stratum's curve
+is a grouped max / sum over the (slice, branch) rows, not another run over
+the trees. A
+stratum's wavefront is still measured from the root of the whole tree. The
+strata of a grouping go into one table with a `group` column, in the sheets
+fig7.py reads for `host` and `wild`.
+
+Input is a store written by tree_extractions.py or a posterior .trees file
+(extracted first, into <trees>_extractions/, with the --stratify groupings).
+
+Usage: python wavefront.py TREES_OR_STORE OUT_PREFIX [--mrsd 2024.49]
+           [--slices 100] [--window 1] [--group NAME] [--excel OUT.xlsx]
+           [--stratify host [--stratify wild=meta.csv:label:wild ...]]
+           [--keep ANSERIFORMES GALLIFORMES] [--burnin N] [--samples N] [--workers N]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from branch_index import BranchIndex
+from tree_extractions import (GROUP_PREFIX, great_circle_km, load_extractions,
+                              parse_group_spec, tree_extractions)
+
+DEFAULT_SLICES = 100
+DEFAULT_WINDOW = 1.0
+DEFAULT_CRED_MASS = 0.95
+
+# Sheet names read by fig7.py / logWFD.py
+WAVEFRONT_SHEET = "median_wavedistance"
+DIFFUSION_SHEET = "diffusion_coefficient_weighted"
+
+# (wavefront, diffusion) sheets of the stratified tables read by fig7.py;
+# other groupings are written as <name>_wavefront / <name>_diffusion
+GROUP_SHEETS = {
+    "host": (WAVEFRONT_SHEET, DIFFUSION_SHEET),
+    "wild": ("wild_demostic_wavefront", "wild_domestic_weightcoefficient"),
+}
+
+
+def tree_columns(table, columns):
+    """
+    Named column views of one tree's branch array.
+    """
+    return {c: table[:, i] for i, c in enumerate(columns)}
+
+
+def root_location(branches):
+    """
+    (lon, lat) of the root: the start point of the branches leaving it.
+    """
+    root = np.flatnonzero(branches["startNodeL"] == 0)
+    first = root[0] if len(root) else np.argmin(branches["startYear"])
+    return branches["startLon"][first], branches["startLat"][first]
+
+
+def front_terms(branches, times, index=None):
+    """
+    Distances (km) from the root that bound the wavefront of one tree at
+    ascending `times`: (slice, branch, distance) of every lineage alive at a
+    slice, at its interpolated position, and (slice, branch, distance) of
+    every branch end point from the first slice at or after its end.
+    """
+    index = index or BranchIndex.from_branches(branches)
+    root_lon, root_lat = root_location(branches)
+    lineages = index.lineages(times)
+    live = (lineages.slice, lineages.branch,
+            great_circle_km(root_lon, root_lat, lineages.lon, lineages.lat))
+    first = np.searchsorted(times, branches["endYear"], side="left")
+    ended = np.flatnonzero(first < len(times))
+    reached = (first[ended], ended,
+               great_circle_km(root_lon, root_lat, branches["endLon"][ended],
+                               branches["endLat"][ended]))
+    return live, reached
+
+
+def window_terms(branches, times, window=DEFAULT_WINDOW, index=None):
+    """
+    (slice, branch, squared distance, time spent) of every branch part
+    inside the window centred on every time.
+    """
+    index = index or BranchIndex.from_branches(branches)
+    offsets, branch = index.pairs(times, pad=window / 2)
+    slices = np.repeat(np.arange(len(times)), np.diff(offsets))
+    t = times[slices]
+    start, end = branches["startYear"][branch], branches["endYear"][branch]
+    overlap = np.clip(np.minimum(end, t + window / 2) - np.maximum(start, t - window / 2),
+                      0, None)
+    duration = end - start
+    share = np.divide(overlap, duration, out=np.zeros_like(overlap), where=duration > 0)
+    distance = share * branches["greatCircleDist_km"][branch]
+    return slices, branch, distance ** 2, overlap
+
+
+def _group_keys(codes, n_branches):
+    return np.zeros(n_branches, dtype=np.int64) if codes is None else codes
+
+
+def _front(terms, codes, n_groups, n_slices):
+    front = np.full((n_groups, n_slices), np.nan)
+    # groups with a branch start from 0, the others stay NaN
+    front[np.unique(codes[codes >= 0])] = 0.0
+    for slices, branch, distance in terms:
+        group = codes[branch]
+        kept = group >= 0
+        np.maximum.at(front, (group[kept], slices[kept]), distance[kept])
+    return np.maximum.accumulate(front, axis=1)
+
+
+def _coefficient(terms, codes, n_groups, n_slices):
+    slices, branch, squared, overlap = terms
+    group = codes[branch]
+    kept = group >= 0
+    cell = group[kept] * n_slices + slices[kept]
+    size = n_groups * n_slices
+    num = np.bincount(cell, squared[kept], minlength=size).reshape(n_groups, n_slices)
+    den = 4 * np.bincount(cell, overlap[kept], minlength=size).reshape(n_groups, n_slices)
+    return np.divide(num, den, out=np.full(num.shape, np.nan), where=den > 0)
+
+
+def wavefront_distance(branches, times, codes=None, n_groups=1):
+    """
+    Wavefront distance (km) from the root at every (ascending) time in
+    `times` for one tree; with branch group `codes` (0..n_groups - 1, -1 left
+    out), one row per group (n_groups x slices), NaN for absent groups.
+    """
+    keys = _group_keys(codes, len(branches["startYear"]))
+    front = _front(front_terms(branches, times), keys, n_groups, len(times))
+    return front if codes is not None else front[0]
+
+
+def weighted_diffusion(branches, times, window=DEFAULT_WINDOW, codes=None, n_groups=1):
+    """
+    Weighted diffusion coefficient (km^2/year) in a window of `window` years
+    centred on every time of `times` for one tree; NaN where no branch
+    overlaps the window. With branch group `codes`, one row per group.
+    """
+    keys = _group_keys(codes, len(branches["startYear"]))
+    coefficient = _coefficient(window_terms(branches, times, window), keys, n_groups,
+                               len(times))
+    return coefficient if codes is not None else coefficient[0]
+
+
+def stratified_curves(branches, times, window=DEFAULT_WINDOW, strata=None):
+    """
+    Wavefront and diffusion curves of one tree, for all branches (key None)
+    and for each grouping of `strata` ({name: (codes, n_groups)}), from one
+    `BranchIndex` query per tree. Returns {key: (wavefront, diffusion)},
+    grouped curves being (n_groups x slices).
+    """
+    index = BranchIndex.from_branches(branches)
+    front = front_terms(branches, times, index)
+    terms = window_terms(branches, times, window, index)
+    everything = _group_keys(None, len(index))
+    curves = {None: (_front(front, everything, 1, len(times))[0],
+                     _coefficient(terms, everything, 1, len(times))[0])}
+    for name, (codes, n_groups) in (strata or {}).items():
+        curves[name] = (_front(front, codes, n_groups, len(times)),
+                        _coefficient(terms, codes, n_groups, len(times)))
+    return curves
+
+
+def hpd_by_slice(values, cred_mass=DEFAULT_CRED_MASS):
+    """
+    Median and shortest `cred_mass` interval across trees (rows) for every
+    slice (column), ignoring NaN. Slices without values give NaN.
+    """
+    n_slices = values.shape[1]
+    median = np.full(n_slices, np.nan)
+    low = np.full(n_slices, np.nan)
+    high = np.full(n_slices, np.nan)
+    ordered = np.sort(values, axis=0)
+    counts = np.isfinite(values).sum(axis=0)
+    for k in np.flatnonzero(counts):
+        x = ordered[:counts[k], k]
+        width = max(int(np.ceil(cred_mass * len(x))), 1)
+        spans = x[width - 1:] - x[:len(x) - width + 1]
+        i = int(np.argmin(spans))
+        median[k] = np.median(x)
+        low[k], high[k] = x[i], x[i + width - 1]
+    return median, low, high
+
+
+_worker = {}
+
+
+def _init_worker(store_dir):
+    _worker["store"] = load_extractions(store_dir)
+
+
+def _curves_task(args):
+    tree_ids, times, window, groups = args
+    store = _worker["store"]
+    results = {}
+    for k in tree_ids:
+        branches = tree_columns(np.asarray(store.tree_array(k)), store.columns)
+        strata = {name: (branches[GROUP_PREFIX + name].astype(np.int64),
+                         len(store.groups[name])) for name in groups}
+        for key, curves in stratified_curves(branches, times, window, strata).items():
+            results.setdefault(key, []).append(curves)
+    return {key: tuple(np.array(c) for c in zip(*curves)) for key, curves in results.items()}
+
+
+def time_slices(store, n_slices=DEFAULT_SLICES):
+    """
+    Slice times from the oldest branch start to the latest branch end over
+    all trees of the store.
+    """
+    return np.linspace(np.min(store.column("startYear")), np.max(store.column("endYear")),
+                       n_slices)
+
+
+def tree_curves(store_dir, times, window=DEFAULT_WINDOW, workers=None, groups=()):
+    """
+    Per-tree wavefront and diffusion curves, each (trees x slices), computed
+    over a process pool. With `groups` (grouping names of the store) returns
+    {None: (waves, diffusion), name: (waves, diffusion) ...}, the grouped
+    curves being (trees x categories x slices).
+    """
+    store = load_extractions(store_dir)
+    missing = [name for name in groups if name not in store.groups]
+    if missing:
+        raise KeyError(f"Store {store_dir} has no grouping {', '.join(missing)} "
+                       f"(available: {', '.join(store.groups) or 'none'})")
+    n_trees = len(store)
+    workers = min(workers or os.cpu_count() or 1, n_trees)
+    chunks = np.array_split(np.arange(n_trees), workers * 4)
+    tasks = [(chunk, times, window, list(groups)) for chunk in chunks if len(chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(store_dir),)) as pool:
+        results = list(pool.map(_curves_task, tasks))
+    curves = {key: (np.concatenate([r[key][0] for r in results]),
+                    np.concatenate([r[key][1] for r in results]))
+              for key in results[0]}
+    return curves if groups else curves[None]
+
+
+def summary_tables(times, waves, diffusion, group=None, cred_mass=DEFAULT_CRED_MASS):
+    """
+    Wavefront and diffusion tables (median and HPD across trees per slice).
+    """
+    distance, low, high = hpd_by_slice(waves, cred_mass)
+    wave_table = pd.DataFrame({"time": times, "distance": distance, "low": low, "high": high})
+    coefficient, low, high = hpd_by_slice(diffusion, cred_mass)
+    diff_table = pd.DataFrame({"time": times, "low": low, "high": high,
+                               "diffusion_coefficient": coefficient})
+    if group is not None:
+        wave_table["group"] = group
+        diff_table["group"] = group
+    return wave_table, diff_table
+
+
+def stratified_tables(times, waves, diffusion, categories, keep=None,
+                      cred_mass=DEFAULT_CRED_MASS):
+    """
+    Wavefront and diffusion tables of all strata of one grouping (curves
+    trees x categories x slices), stacked with a `group` column; `keep`
+    restricts them to some categories.
+    """
+    wave_tables, diff_tables = [], []
+    for g, category in enumerate(categories):
+        if keep and category not in keep:
+            continue
+        wave_table, diff_table = summary_tables(times, waves[:, g], diffusion[:, g],
+                                                category, cred_mass)
+        wave_tables.append(wave_table)
+        diff_tables.append(diff_table)
+    if not wave_tables:
+        raise ValueError(f"None of {', '.join(keep)} among the strata "
+                         f"({', '.join(categories)})")
+    return (pd.concat(wave_tables, ignore_index=True),
+            pd.concat(diff_tables, ignore_index=True))
+
+
+def resolve_store(source, most_recent_sampling_datum=None, burnin=0, n_samples=None,
+                  workers=None, groups=None):
+    """
+    Use `source` as an extraction store, or extract a .trees file (with the
+    branch `groups`) into `<trees>_extractions/` first.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return source
+    if most_recent_sampling_datum is None:
+        raise ValueError("--mrsd is needed to extract a .trees file")
+    store_dir = source.with_name(source.stem + "_extractions")
+    tree_extractions(source, store_dir, most_recent_sampling_datum, burnin=burnin,
+                     n_samples=n_samples, workers=workers, groups=groups)
+    return store_dir
+
+
+def write_tables(tables, out_prefix, excel=None):
+    """
+    Write {sheet name: table} as `<out_prefix>_<sheet>.tsv` files and,
+    optionally, as sheets of one Excel workbook.
+    """
+    for sheet, table in tables.items():
+        path = f"{out_prefix}_{sheet}.tsv"
+        table.to_csv(path, sep="\t", index=False)
+        print(f"Table written to: {path}")
+    if excel:
+        with pd.ExcelWriter(excel) as writer:
+            for sheet, table in tables.items():
+                table.to_excel(writer, sheet_name=sheet, index=False)
+        print(f"Workbook written to: {excel}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="tree_extractions store or posterior .trees file")
+    parser.add_argument("out_prefix", help="prefix of the output tables")
+    parser.add_argument("--mrsd", type=float, default=None,
+                        help="most recent sampling date (needed for a .trees file)")
+    parser.add_argument("--burnin", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=None)
+    parser.add_argument("--slices", type=int, default=DEFAULT_SLICES,
+                        help=f"number of time slices (default {DEFAULT_SLICES})")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW,
+                        help="sliding window of the diffusion coefficient, in years")
+    parser.add_argument("--group", default=None, help="value of the 'group' column")
+    parser.add_argument("--stratify", action="append", default=[], metavar="SPEC",
+                        help="branch grouping of the store, or for a .trees file an "
+                             "annotation NAME or NAME=META.csv:TAXON_COL:VALUE_COL "
+                             "(repeatable)")
+    parser.add_argument("--keep", nargs="+", default=None,
+                        help="strata written to the grouped tables (default: all)")
+    parser.add_argument("--excel", default=None, help="also write an .xlsx workbook")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    groups = dict(map(parse_group_spec, args.stratify))
+    store_dir = resolve_store(args.source, args.mrsd, args.burnin, args.samples, args.workers,
+                              groups)
+    store = load_extractions(store_dir)
+    times = time_slices(store, args.slices)
+    curves = tree_curves(store_dir, times, args.window, args.workers, groups=list(groups))
+    waves, diffusion = curves[None] if groups else curves
+    wave_table, diff_table = summary_tables(times, waves, diffusion, args.group)
+    tables = {WAVEFRONT_SHEET: wave_table, DIFFUSION_SHEET: diff_table}
+    # fig7.py's host-stratified sheets take the place of the all-branch ones
+    for name in groups:
+        wave_sheet, diff_sheet = GROUP_SHEETS.get(name, (f"{name}_wavefront",
+                                                         f"{name}_diffusion"))
+        tables[wave_sheet], tables[diff_sheet] = stratified_tables(
+            times, *curves[name], store.groups[name], args.keep)
+    write_tables(tables, args.out_prefix, args.excel)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,14 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 
-DATA_CONFIG = {
-    'H7': {
-        'regions': ["Africa", "Asia", "Europe", "North America", "South America"],
-        'values': [62.908, 558.194, 349.981, 275.364, 62.908]
-    },
-    'H7N3': {
-        'regions': ["Africa", "Asia", "Europe", "North America", "Oceania", "South America"],
-        'values': [11.95, 280.213, 160.476, 456.726, 12.922, 98.636]
-    },
-    'H7N7': {
-        'regions': ["Africa", "Asia", "Europe", "North America", "Oceania"],
-        'values': [47.46, 340.604, 279.129, 50.824, 15.704]
-    },
-    'H7N9': {
-        'regions': ["Africa", "Asia", "Europe", "North America", "Oceania", "South America"],
-        'values': [9.778, 434.609, 68.409, 119.438, 33.663, 30.835]
-    }
+# Markov rewards (time spent per region) logged by BEAST, from src/glm/markov_rewards.py:
+#   python markov_rewards.py <fileLog>.log --xml <subtype>.xml <subtype>_markov.xlsx
+MARKOV_FILE = '{subtype}_markov.xlsx'
+REWARD_SHEET = 'continent_rewards'
+
+REGION_LABELS = {
+    'NorthAmerica': 'North America',
+    'SouthAmerica': 'South America'
 }
 
 REGION_COLORS = {
@@ -29,6 +20,20 @@ REGION_COLORS = {
     'Oceania': '#FF9DA7'
 }
 
+def load_rewards(subtype):
+    """Posterior mean time spent in each region for one subtype."""
+    path = MARKOV_FILE.format(subtype=subtype)
+    try:
+        rewards = pd.read_excel(path, sheet_name=REWARD_SHEET)
+    except FileNotFoundError:
+        raise ValueError(f"No Markov rewards for {subtype}: run markov_rewards.py "
+                         f"on the {subtype} log to write {path}") from None
+    return pd.DataFrame({
+        'Region': rewards['State'].replace(REGION_LABELS),
+        'Value': rewards['reward']
+    })
+
+
 def visualize_virus_data(subtype='H7', plot_type='donut'):
     """参数化可视化函数
     
@@ -36,14 +41,7 @@ def visualize_virus_data(subtype='H7', plot_type='donut'):
         subtype (str): 病毒亚型 (H7, H7N3, H7N7, H7N9)
         plot_type (str): 可视化类型 (donut, bar)
     """
-    data = DATA_CONFIG.get(subtype)
-    if not data:
-        raise ValueError(f"Invalid subtype: {subtype}")
-    
-    df = pd.DataFrame({
-        'Region': data['regions'],
-        'Value': data['values']
-    })
+    df = load_rewards(subtype)
     total = df['Value'].sum()
     df['Percentage'] = df['Value'] / total * 100
     
@@ -44,8 +44,18 @@ nodes = pd.DataFrame(
 subtype_name = "H7N9"
 show_legend = False
 
-df = pd.read_excel("H7_map(1).xlsx", sheet_name=subtype_name)
-df.columns = df.columns.str.strip()
+# BF / PP per ordered pair from src/glm/bssvs.py (bssvs.tsv, --labels H7 H7N3 ...);
+# MJ (posterior mean logged jumps) from src/glm/markov_rewards.py -> <subtype>_markov.xlsx
+region_labels = {"NorthAmerica": "North America", "SouthAmerica": "South America"}
+
+support = pd.read_csv("bssvs.tsv", sep="\t")
+support = support[(support["label"] == subtype_name) & (support["trait"] == "continent")]
+df = support.rename(columns={"origin": "From", "destination": "To"})[["From", "To", "BF", "PP"]]
+
+jumps = pd.read_excel(f"{subtype_name}_markov.xlsx", sheet_name="continent_jumps")
+df = (df.merge(jumps[["From", "To", "MJ"]], on=["From", "To"], how="left")
+        .fillna({"MJ": 0}))
+df[["From", "To"]] = df[["From", "To"]].replace(region_labels)
 
 df = (
     df.merge(nodes, left_on="From", right_on="country", how="left")